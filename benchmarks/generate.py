@@ -0,0 +1,166 @@
+""" build a synthetic vinca collection for benchmarking
+
+        python -m benchmarks.generate bench.sqlite --cards 100000 --years 5
+
+The same arguments always give the same collection: card ids, texts, tags,
+images and review histories all come from one seeded random generator, and
+review dates are counted back from --end (a day number, default today).
+Reviews follow the scheduler's own rules (vinca_CLI._scheduling.due_date),
+so due dates, lapses and review density look like those of a real user.
+
+The schema is copied from --template, an existing collection whose rows are
+discarded. Without one we build the log tables from the sync template and
+add a reference `cards` view and `tags` table over them. """
+
+import argparse
+import random
+import shutil
+import sqlite3
+import struct
+import zlib
+from pathlib import Path
+
+from vinca_CLI._lib.julianday import today
+from vinca_CLI._scheduling import due_date
+
+MESSENGER_TEMPLATE = Path(__file__).parent.parent / 'vinca_CLI' / 'messenger_template.sqlite'
+GRADES = ('again', 'hard', 'good', 'easy')
+GRADE_WEIGHTS = (0.12, 0.13, 0.6, 0.15)
+WORDS = ('cell membrane protein enzyme acid base vector matrix theorem proof river empire treaty '
+         'verb noun declension aorist particle orbit mass charge field wave ratio limit series').split()
+EDITED_FIELDS = ('front_text', 'back_text', 'card_type', 'visibility', 'tags',
+                 'front_image_id', 'back_image_id', 'front_audio_id', 'back_audio_id', 'merit')
+DEFAULTS = {'front_text': "''", 'back_text': "''", 'tags': "''",
+            'visibility': "'visible'", 'card_type': "'basic'"}
+
+
+def _latest(field):
+        return (f'(SELECT {field} FROM edits e2 WHERE e2.card_id = e.card_id AND e2.{field} IS NOT NULL '
+                f'ORDER BY e2.date DESC LIMIT 1)')
+
+
+def _reference_schema():
+        fields = ',\n'.join(f'coalesce({_latest(f)}, {DEFAULTS[f]}) AS {f}' if f in DEFAULTS else f'{_latest(f)} AS {f}'
+                            for f in EDITED_FIELDS)
+        review_seconds = 'coalesce((SELECT sum(seconds) FROM reviews r WHERE r.card_id = e.card_id), 0)'
+        return f'''
+        CREATE INDEX IF NOT EXISTS edits_card_date ON edits (card_id, date);
+        CREATE VIEW cards AS SELECT card_id AS id,
+                min(date) AS create_date,
+                coalesce({_latest('due_date')}, min(date)) AS due_date,
+                max(date) AS last_edit_date,
+                (SELECT max(date) FROM reviews r WHERE r.card_id = e.card_id) AS last_review_date,
+                sum(seconds) AS edit_seconds,
+                {review_seconds} AS review_seconds,
+                sum(seconds) + {review_seconds} AS total_seconds,
+                {fields}
+                FROM edits e GROUP BY card_id;
+        CREATE TABLE tags (tag TEXT, card_id INTEGER, UNIQUE (tag, card_id) ON CONFLICT IGNORE);
+        '''
+
+
+def _create(path, template):
+        path = Path(path)
+        if path.exists():
+                path.unlink()
+        if template:
+                shutil.copy(template, path)
+                connection = sqlite3.connect(path)
+                tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+                for table in tables:
+                        connection.execute(f'DELETE FROM "{table}"')
+                connection.commit()
+                return connection
+        shutil.copy(MESSENGER_TEMPLATE, path)
+        connection = sqlite3.connect(path)
+        connection.executescript(_reference_schema())
+        return connection
+
+
+def png(rng, width, height):
+        """ a noisy greyscale PNG, so that it does not compress to nothing """
+        def chunk(kind, data):
+                return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+        # Random.randbytes would need python 3.9; this gives the same bytes
+        rows = b''.join(b'\x00' + rng.getrandbits(8 * width).to_bytes(width, 'little') for _ in range(height))
+        return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+                + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b''))
+
+
+def _text(rng, n):
+        return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def _history(rng, create_date, end):
+        """ the reviews of one card, scheduled by the real rules, and its final due date """
+        reviews = []
+        reset = study = grade = None
+        due = create_date + rng.random() * 2  # new cards are studied soon after they are made
+        while due < end:
+                date = due + rng.expovariate(1.5)  # people are often a little late
+                if date >= end:
+                        break
+                grade = rng.choices(GRADES, GRADE_WEIGHTS)[0]
+                reset = date if grade == 'again' else reset
+                study = date
+                reviews.append((date, rng.randrange(2, 40), grade))
+                due = due_date(create_date, reset, study, grade)
+        return reviews, due
+
+
+def generate(path, cards=10000, tags=50, images=200, years=3, seed=0, end=None, template=None):
+        """ write a collection to path; returns the number of (cards, reviews, images) """
+        rng = random.Random(seed)
+        end = today() if end is None else end
+        connection = _create(path, template)
+        cursor = connection.cursor()
+        vocabulary = [f'{rng.choice(WORDS)}_{i}' for i in range(tags)]
+        media = []
+        for _ in range(images):
+                side = rng.choice((64, 128, 256))
+                media.append((rng.getrandbits(63), png(rng, side, side)))
+        edits, reviews = [], []
+        for i in range(cards):
+                card_id = rng.getrandbits(63)
+                create_date = end - rng.random() * 365 * years
+                verses = rng.random() < 0.1
+                front = '\n'.join(_text(rng, 6) for _ in range(4)) if verses else _text(rng, rng.randrange(3, 15)) + '?'
+                back = '' if verses else _text(rng, rng.randrange(1, 25))
+                card_tags = ' '.join(rng.sample(vocabulary, rng.randrange(0, 4))) if vocabulary else ''
+                image = rng.choice(media)[0] if media and rng.random() < 0.05 else None
+                edits.append((rng.getrandbits(63), card_id, create_date, rng.randrange(5, 90), front, back, None,
+                              'verses' if verses else 'basic', 'visible', image, card_tags))
+                history, due = _history(rng, create_date, end)
+                reviews += [(rng.getrandbits(63), card_id, date, seconds, grade) for date, seconds, grade in history]
+                last = history[-1][0] if history else create_date
+                visibility = 'deleted' if rng.random() < 0.02 else None
+                edits.append((rng.getrandbits(63), card_id, last, 0, None, None, due, None, visibility, None, None))
+        with connection:
+                cursor.executemany('INSERT INTO edits (id, card_id, date, seconds, front_text, back_text, due_date, '
+                                   'card_type, visibility, front_image_id, tags) VALUES (?,?,?,?,?,?,?,?,?,?,?)', edits)
+                cursor.executemany('INSERT INTO reviews (id, card_id, date, seconds, grade) VALUES (?,?,?,?,?)', reviews)
+                cursor.executemany('INSERT INTO media (id, content) VALUES (?,?)', media)
+                if not template:
+                        cursor.executemany('INSERT INTO tags VALUES (?, ?)', [(tag, e[1]) for e in edits if e[10]
+                                                                              for tag in e[10].split()])
+        connection.close()
+        return cards, len(reviews), len(media)
+
+
+def main(argv=None):
+        parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+        parser.add_argument('path')
+        parser.add_argument('--cards', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--images', type=int, default=200)
+        parser.add_argument('--years', type=float, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--end', type=int, default=None, help='day number (days since 1970) of the last review')
+        parser.add_argument('--template', default=None, help='an existing collection to copy the schema from')
+        args = parser.parse_args(argv)
+        counts = generate(args.path, args.cards, args.tags, args.images, args.years, args.seed, args.end, args.template)
+        print('%d cards, %d reviews, %d images written to %s' % (*counts, args.path))
+
+
+if __name__ == '__main__':
+        main()
@@ -0,0 +1,216 @@
+""" end-to-end benchmarks of the vinca interface
+
+        python -m benchmarks.run --cards 20000
+        python -m benchmarks.run --compare benchmarks/results/1c1ecb1.json
+
+Each scenario drives the real interface objects headlessly: keys come from
+a script instead of the terminal and everything printed is captured.
+Scenarios which write (reviewing) work on a fresh copy of the collection.
+Results are saved as benchmarks/results/<commit>.json so that runs at
+different commits can be compared. """
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+# a fixed terminal, and images drawn with text so that no graphics protocol is needed
+os.environ.setdefault('COLUMNS', '100')
+os.environ.setdefault('LINES', '40')
+os.environ['VINCA_IMAGE_PROTOCOL'] = 'halfblock'
+os.environ.pop('DISPLAY', None)
+
+from benchmarks.generate import generate
+from vinca_CLI._lib import readkey
+from vinca_CLI._CLI_cardlist import CLI_Cardlist, CardSequence
+from vinca_CLI._browser import Browser
+from vinca_CLI._card_state import CardState
+from vinca_CLI._statistics import Statistics
+from vinca_CLI._merge import merge
+
+RESULTS = Path(__file__).parent / 'results'
+
+
+class ScriptedKeys:
+        """ stands in for readkey.reader: hands out keys from a script, then 'q' """
+
+        fd = None
+
+        def __init__(self, keys):
+                self.keys = iter(keys)
+
+        def readkey(self):
+                return next(self.keys, 'q')
+
+        def enter(self):
+                pass
+
+        def exit(self):
+                pass
+
+
+def scripted(keys):
+        readkey.reader = ScriptedKeys(keys)
+
+
+def timed(function, repeat, setup=None):
+        """ the durations of `repeat` calls; setup runs untimed before each call """
+        durations = []
+        for _ in range(repeat):
+                argument = setup() if setup else None
+                with redirect_stdout(io.StringIO()):
+                        begin = time.perf_counter()
+                        try:
+                                function(argument) if setup else function()
+                        except SystemExit:
+                                pass  # the browser quits by calling exit()
+                        durations.append(time.perf_counter() - begin)
+        return durations
+
+
+class Bench:
+
+        def __init__(self, collection, repeat, workdir):
+                self.collection = collection
+                self.repeat = repeat
+                self.workdir = workdir
+                self.cursor = sqlite3.connect(collection).cursor()
+                self.cards = CLI_Cardlist(self.cursor)
+                self.tag = self.cursor.execute('SELECT tag FROM tags GROUP BY tag ORDER BY count(*) DESC').fetchone()[0]
+
+        def _copy(self):
+                copy = self.workdir / 'copy.sqlite'
+                shutil.copy(self.collection, copy)
+                return CLI_Cardlist(sqlite3.connect(copy).cursor())
+
+        def install_card_state(self):
+                install = lambda cursor: CardState(cursor).install()
+                return timed(install, 1, setup=lambda: sqlite3.connect(self._fresh()).cursor())
+
+        def _fresh(self):
+                # the collection as generated, before card_state exists
+                fresh = self.workdir / 'fresh.sqlite'
+                shutil.copy(self.workdir / 'generated.sqlite', fresh)
+                return fresh
+
+        def count(self):
+                return timed(self.cards.count, self.repeat)
+
+        def filter(self):
+                return timed(lambda: len(self.cards.filter(tag=self.tag, due=True, deleted=False)), self.repeat)
+
+        def findall(self):
+                return timed(lambda: len(self.cards.findall('membrane')), self.repeat)
+
+        def stats(self):
+                return timed(Statistics(self.cursor).print, self.repeat)
+
+        def browse(self):
+                # scroll down through 200 cards and back up 50, then quit
+                def browse():
+                        scripted(['j'] * 200 + ['k'] * 50 + ['q'])
+                        Browser(CardSequence(self.cards.ids(), self.cursor),
+                                self.cards._make_basic_card, self.cards._make_verses_card).browse()
+                return timed(browse, self.repeat)
+
+        def review(self, cards=100):
+                """ seconds per card: show the card, flip it with space, grade it 'good' with space """
+                reviewed = []
+
+                def review(cardlist):
+                        scripted([' '] * (2 * cards))
+                        message = cardlist.review()
+                        reviewed.append(int(message.split()[0]) if message[0].isdigit() else 0)
+                durations = timed(review, self.repeat, setup=self._copy)
+                return [d / max(1, n) for d, n in zip(durations, reviewed)]
+
+        def merge(self):
+                """ merge another device's collection, half the size and with its own cards, into a copy """
+                other = self.workdir / 'other.sqlite'
+                if not other.exists():
+                        generate(other, cards=len(self.cards) // 2, images=0, seed=1)
+                return timed(lambda cardlist: merge(cardlist._cursor, other), 1, setup=self._copy)
+
+
+SCENARIOS = ('install_card_state', 'count', 'filter', 'findall', 'stats', 'browse', 'review', 'merge')
+
+
+def commit():
+        try:
+                sha = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                     check=True, cwd=Path(__file__).parent).stdout.strip()
+                dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                                       text=True, cwd=Path(__file__).parent).stdout.strip()
+                return sha + ('-dirty' if dirty else '')
+        except (OSError, subprocess.CalledProcessError):
+                return 'unknown'
+
+
+def summarize(durations):
+        return {'min': min(durations), 'median': statistics.median(durations), 'runs': len(durations)}
+
+
+def compare(results, baseline):
+        print(f'{"scenario":20s} {"baseline ms":>12s} {"now ms":>10s} {"change":>8s}')
+        for name, now in results['scenarios'].items():
+                before = baseline['scenarios'].get(name)
+                if not before:
+                        continue
+                change = now['min'] / before['min'] - 1
+                print(f'{name:20s} {before["min"] * 1000:12.2f} {now["min"] * 1000:10.2f} {change:+8.0%}')
+
+
+def main(argv=None):
+        parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+        parser.add_argument('--cards', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--images', type=int, default=200)
+        parser.add_argument('--years', type=float, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--template', default=None, help='an existing collection to copy the schema from')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--only', nargs='*', choices=SCENARIOS, default=SCENARIOS)
+        parser.add_argument('--compare', default=None, help='a results file to compare with')
+        parser.add_argument('--output', default=None, help='where to save the results')
+        args = parser.parse_args(argv)
+
+        with tempfile.TemporaryDirectory() as workdir:
+                workdir = Path(workdir)
+                generated = workdir / 'generated.sqlite'
+                counts = generate(generated, args.cards, args.tags, args.images, args.years, args.seed,
+                                  template=args.template)
+                collection = workdir / 'collection.sqlite'
+                shutil.copy(generated, collection)
+                CardState(sqlite3.connect(collection).cursor()).install()
+                bench = Bench(collection, args.repeat, workdir)
+                results = {'commit': commit(),
+                           'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                           'python': platform.python_version(),
+                           'sqlite': sqlite3.sqlite_version,
+                           'collection': dict(zip(('cards', 'reviews', 'images'), counts), tags=args.tags,
+                                              years=args.years, seed=args.seed),
+                           'scenarios': {}}
+                for name in args.only:
+                        results['scenarios'][name] = summarize(getattr(bench, name)())
+                        print(f'{name:20s} {results["scenarios"][name]["min"] * 1000:10.2f} ms', file=sys.stderr)
+
+        output = Path(args.output) if args.output else RESULTS / f'{results["commit"]}.json'
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=1))
+        print(f'results saved to {output}', file=sys.stderr)
+        if args.compare:
+                compare(results, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == '__main__':
+        main()
@@ -0,0 +1,31 @@
+import sqlite3
+
+import pytest
+
+from benchmarks.generate import generate
+from vinca_CLI._card_state import CardState
+from vinca_CLI._card_stats import CardStats
+
+
+def open_collection(path, cards=200, seed=0):
+        """ a generated collection with the tables vinca_CLI keeps beside the logs """
+        generate(path, cards=cards, tags=8, images=10, years=2, seed=seed)
+        cursor = sqlite3.connect(path).cursor()
+        CardState(cursor).install()
+        CardStats(cursor).install()
+        return cursor
+
+
+@pytest.fixture
+def cursor(tmp_path):
+        cursor = open_collection(tmp_path / 'george.sqlite')
+        yield cursor
+        cursor.connection.close()
+
+
+@pytest.fixture
+def collection_file(tmp_path):
+        """ the path of a generated collection which is not open """
+        path = tmp_path / 'george.sqlite'
+        open_collection(path).connection.close()
+        return path
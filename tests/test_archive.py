@@ -0,0 +1,45 @@
+from vinca_CLI._archive import Archive
+from vinca_CLI._card_state import COLUMNS, CardState
+
+STATE = f'SELECT {", ".join(COLUMNS)} FROM card_state ORDER BY id'
+
+
+def synced(cursor):
+        cursor.execute('UPDATE reviews SET server_timestamp = 100')
+        cursor.connection.commit()
+
+
+def test_moving_reviews_keeps_card_state(cursor):
+        synced(cursor)
+        state = cursor.execute(STATE).fetchall()
+        reviews = cursor.execute('SELECT count(*) FROM reviews').fetchone()[0]
+        archive = Archive(cursor)
+        moved = int(archive.move(days=30).split()[0])
+        assert moved
+        assert archive.status()['live reviews'] == reviews - moved
+        assert archive.status()['archived reviews'] == moved
+        # the seconds of archived reviews still count
+        assert cursor.execute(STATE).fetchall() == state
+        assert CardState(cursor).verify() == 'card state is consistent'
+        assert archive.move(days=30).startswith('0 reviews')
+
+
+def test_edit_after_moving_keeps_archived_seconds(cursor):
+        synced(cursor)
+        Archive(cursor).move(days=30)
+        card_id, seconds = cursor.execute('SELECT card_id, sum(seconds) FROM archive.reviews '
+                                          'GROUP BY card_id LIMIT 1').fetchone()
+        before = cursor.execute('SELECT review_seconds FROM card_state WHERE id = ?', (card_id,)).fetchone()[0]
+        # an edit older than the newest one makes the trigger recompute the card
+        cursor.execute("INSERT INTO edits (card_id, date, back_text) VALUES (?, 0, 'old')", (card_id,))
+        cursor.connection.commit()
+        assert cursor.execute('SELECT review_seconds FROM card_state WHERE id = ?', (card_id,)).fetchone()[0] == before
+        assert before >= seconds
+        assert CardState(cursor).verify() == 'card state is consistent'
+
+
+def test_move_after_a_failed_move(cursor):
+        synced(cursor)
+        # the table a move interrupted by an error leaves on the connection
+        cursor.execute('CREATE TEMP TABLE archivable (rid, card_id)')
+        assert not Archive(cursor).move(days=30).startswith('0 reviews')
@@ -0,0 +1,33 @@
+import pytest
+
+from vinca_CLI import _backup
+from vinca_CLI._backup import Backups
+
+# files a shared backup_path may hold beside the snapshots of george.sqlite
+UNRELATED = ('george-work.sqlite', 'george-work-20200101-000000.sqlite', 'george-notes.sqlite.gz',
+             'george-20200101-000000.sqlite.bak', 'henry-20200101-000000.sqlite')
+
+
+def test_rotation_keeps_unrelated_files(cursor, tmp_path, monkeypatch):
+        shared = tmp_path / 'backups'
+        monkeypatch.setattr(_backup, 'backup_path', str(shared))
+        shared.mkdir()
+        for name in UNRELATED:
+                (shared / name).write_bytes(b'')
+        for stamp in ('20200101-000000', '20200102-000000'):
+                (shared / f'george-{stamp}.sqlite.gz').write_bytes(b'')
+                (shared / f'george-{stamp}.archive.sqlite.gz').write_bytes(b'')
+        backups = Backups(cursor)
+        assert backups.make(keep=2, quiet=True).endswith('1 old snapshots removed')
+        assert list(backups.list())[1:] == ['20200102-000000']
+        assert all((shared / name).exists() for name in UNRELATED)
+        assert not (shared / 'george-20200101-000000.archive.sqlite.gz').exists()
+
+
+def test_interrupted_copy_leaves_no_partial_file(cursor, tmp_path):
+        def interrupt(status, remaining, total):
+                raise KeyboardInterrupt
+        destination = tmp_path / 'copy.sqlite'
+        with pytest.raises(KeyboardInterrupt):
+                _backup.copy(cursor.connection, destination, pages=1, progress=interrupt)
+        assert list(tmp_path.glob('copy.sqlite*')) == []
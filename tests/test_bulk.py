@@ -0,0 +1,41 @@
+from vinca_CLI import _bulk
+from vinca_CLI._card_state import CardState
+from vinca_CLI._lib.julianday import today
+
+
+def tagged(cursor, *tags):
+        for card_id, card_tags in enumerate(tags, start=1):
+                cursor.execute('INSERT INTO edits (card_id, date, front_text, tags) VALUES (?, ?, ?, ?)',
+                               (card_id, today(), 'question', card_tags))
+        cursor.connection.commit()
+        return _bulk.ids_sql(range(1, len(tags) + 1))
+
+
+def tags(cursor):
+        return [row[0] for row in cursor.execute('SELECT tags FROM card_state WHERE id < 10 ORDER BY id')]
+
+
+def test_tags_are_matched_as_whole_words(cursor):
+        selection = tagged(cursor, 'axb', 'a_b', '100%')
+        assert _bulk.retag(cursor, selection, add=['a_b', '1%']) == 3
+        assert tags(cursor) == ['axb a_b 1%', 'a_b 1%', '100% a_b 1%']
+        assert _bulk.retag(cursor, selection, remove=['a_b', '%']) == 3
+        assert tags(cursor) == ['axb 1%', '1%', '100% 1%']
+
+
+def test_retag_leaves_each_tag_once(cursor):
+        selection = tagged(cursor, 'a b a', 'a a', 'c')
+        _bulk.retag(cursor, selection, add=['c'], remove=['b'])
+        assert tags(cursor) == ['a c', 'a c', 'c']
+        assert _bulk.retag(cursor, selection, add=['c']) == 0
+
+
+def test_bulk_edits_keep_card_state_consistent(cursor):
+        selection = 'SELECT id FROM card_state LIMIT 20'
+        ids = [row[0] for row in cursor.execute(selection)]
+        assert _bulk.postpone(cursor, selection, n=3) == 20
+        assert _bulk.toggle_delete(cursor, _bulk.ids_sql(ids)) > 0
+        _bulk.retag(cursor, selection, add=['marked'])
+        assert CardState(cursor).verify() == 'card state is consistent'
+        due_dates = {row[0] for row in cursor.execute(f'SELECT due_date FROM card_state WHERE id IN ({selection})')}
+        assert due_dates == {today() + 3}
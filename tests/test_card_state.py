@@ -0,0 +1,39 @@
+from vinca_CLI._card_state import CardState, EDIT_TRIGGER
+from vinca_CLI._lib.julianday import today
+
+CONSISTENT = 'card state is consistent'
+
+
+def test_installed_state_is_consistent(cursor):
+        assert CardState(cursor).verify() == CONSISTENT
+
+
+def test_edits_and_reviews_keep_state_consistent(cursor):
+        ids = [row[0] for row in cursor.execute('SELECT id FROM card_state LIMIT 3')]
+        # a new card, an edit in date order, an edit older than the newest, and a review
+        cursor.execute("INSERT INTO edits (card_id, date, front_text, tags) VALUES (7, ?, 'q', 'a b')", (today(),))
+        cursor.execute("INSERT INTO edits (card_id, date, back_text) VALUES (?, ?, 'newest')", (ids[0], today() + 1))
+        cursor.execute("INSERT INTO edits (card_id, date, back_text, seconds) VALUES (?, 0, 'oldest', 9)", (ids[1],))
+        cursor.execute("INSERT INTO reviews (card_id, date, seconds, grade) VALUES (?, ?, 4, 'good')", (ids[2], today()))
+        cursor.connection.commit()
+        assert CardState(cursor).verify() == CONSISTENT
+        assert cursor.execute('SELECT back_text FROM card_state WHERE id = ?', (ids[0],)).fetchone()[0] == 'newest'
+
+
+def test_verify_repairs(cursor):
+        cursor.execute("UPDATE card_state SET front_text = 'wrong' WHERE id IN (SELECT id FROM card_state LIMIT 2)")
+        cursor.connection.commit()
+        state = CardState(cursor)
+        assert state.verify().startswith('2 inconsistent cards')
+        assert state.verify(repair=True) == '2 inconsistent cards repaired'
+        assert state.verify() == CONSISTENT
+
+
+def test_old_edit_trigger_is_replaced(cursor):
+        cursor.execute('DROP TRIGGER card_state_edit')
+        cursor.execute('CREATE TRIGGER card_state_edit AFTER INSERT ON edits BEGIN SELECT 1; END')
+        cursor.connection.commit()
+        CardState(cursor).install()
+        assert cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'card_state_edit'").fetchone()[0] == \
+               EDIT_TRIGGER
+        assert CardState(cursor).verify() == CONSISTENT
@@ -0,0 +1,66 @@
+from vinca_CLI import _card_stats
+from vinca_CLI._card_stats import CardStats, build_sql
+from vinca_CLI._CLI_card import CLI_Card
+from vinca_CLI._config import leech_lapses
+
+
+def stats(cursor, source, card_id):
+        # reviews, lapses, last_grades, score_total and ease_trend of one card
+        row = cursor.execute(f'SELECT * FROM ({source}) WHERE card_id = ?', (card_id,)).fetchone()
+        return row[1], row[2], row[5], row[6], round(row[7], 9)
+
+
+def test_late_review_goes_among_recent_grades(cursor):
+        card_id = cursor.execute('SELECT card_id FROM reviews GROUP BY card_id HAVING count(*) > 3').fetchone()[0]
+        dates = [row[0] for row in cursor.execute('SELECT date FROM reviews WHERE card_id = ? ORDER BY date DESC',
+                                                   (card_id,))]
+        # a review between the newest two, as a merge or sync would bring it, and one before all the others
+        for date in ((dates[0] + dates[1]) / 2, dates[-1] - 1):
+                cursor.execute("INSERT INTO reviews (card_id, date, seconds, grade) VALUES (?, ?, 3, 'easy')",
+                               (card_id, date))
+        cursor.connection.commit()
+        assert stats(cursor, 'SELECT * FROM card_stats', card_id) == stats(cursor, build_sql('reviews'), card_id)
+
+
+def test_old_trigger_is_replaced(cursor):
+        cursor.execute('DROP TRIGGER card_stats_review')
+        cursor.execute('CREATE TRIGGER card_stats_review AFTER INSERT ON reviews BEGIN SELECT 1; END')
+        cursor.execute('UPDATE card_stats SET lapses = -1')
+        cursor.connection.commit()
+        CardStats(cursor).install()
+        assert cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'card_stats_review'").fetchone()[0] == \
+               _card_stats.TRIGGER
+        assert cursor.execute('SELECT count(*) FROM card_stats WHERE lapses < 0').fetchone()[0] == 0
+
+
+def test_leeches_of_a_list_are_read_at_once(cursor):
+        ids = [row[0] for row in cursor.execute('SELECT card_id FROM card_stats LIMIT 6')]
+        cursor.execute('UPDATE card_stats SET lapses = ? WHERE card_id = ?', (leech_lapses, ids[0]))
+        cursor.connection.commit()
+        statements = []
+        cursor.connection.set_trace_callback(statements.append)
+        cards = CLI_Card.many(ids, cursor)
+        flags = [card.is_leech for card in cards]
+        cursor.connection.set_trace_callback(None)
+        assert flags == [True] + [False] * 5
+        assert sum('card_stats' in statement for statement in statements) == 1
+        assert CLI_Card(ids[0], cursor).is_leech
+
+
+def test_built_rows_match_the_reviews(cursor):
+        # every card's statistics, worked out from its reviews in date order
+        reviews = {}
+        for card_id, grade, seconds in cursor.execute('SELECT card_id, grade, seconds FROM reviews ORDER BY date'):
+                reviews.setdefault(card_id, []).append((grade, seconds or 0))
+        scores = {'again': 0, 'hard': 1, 'good': 2, 'easy': 3}
+        expected = {}
+        for card_id, history in reviews.items():
+                grades = [grade for grade, seconds in history]
+                recent = grades[-_card_stats.RECENT:]
+                total = sum(scores[grade] for grade in grades)
+                expected[card_id] = (len(grades), grades.count('again'), sum(s for g, s in history),
+                                     ''.join(grade[0] for grade in recent),
+                                     round(sum(scores[g] for g in recent) / len(recent) - total / len(grades), 9))
+        built = {row[0]: (row[1], row[2], row[3], row[5], round(row[7], 9))
+                 for row in cursor.execute(build_sql('reviews'))}
+        assert built == expected
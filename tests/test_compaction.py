@@ -0,0 +1,95 @@
+from vinca_CLI._card_state import COLUMNS, CardState
+from vinca_CLI._compaction import Compactor, set_checkpoint
+from vinca_CLI._lib.julianday import today
+
+CARDS = f'SELECT {", ".join(COLUMNS)} FROM cards ORDER BY id'
+
+
+def retype(cursor, card_id, times, start=None):
+        start = today() + 1 if start is None else start
+        for i in range(times):
+                cursor.execute('INSERT INTO edits (card_id, date, seconds, front_text, back_text) VALUES (?, ?, 10, ?, ?)',
+                               (card_id, start + i / 100, f'question {i}', f'answer {i}'))
+        cursor.connection.commit()
+
+
+def some_cards(cursor, n=5):
+        return [row[0] for row in cursor.execute('SELECT id FROM card_state ORDER BY id LIMIT ?', (n,))]
+
+
+def test_unsynced_compaction_keeps_card_state(cursor):
+        for card_id in some_cards(cursor):
+                retype(cursor, card_id, 4)
+        cards = cursor.execute(CARDS).fetchall()
+        assert Compactor(cursor).coalesce_unsynced() == 5 * 3
+        assert cursor.execute(CARDS).fetchall() == cards
+        assert CardState(cursor).verify() == 'card state is consistent'
+
+
+def seconds_per_card(cursor):
+        return cursor.execute('SELECT card_id, total(seconds) FROM edits GROUP BY card_id ORDER BY card_id').fetchall()
+
+
+def test_synced_edits_are_not_changed(cursor):
+        card_ids = some_cards(cursor)
+        for card_id in card_ids:
+                retype(cursor, card_id, 3)
+        cursor.execute('UPDATE edits SET server_timestamp = 100')
+        set_checkpoint(cursor, 100)
+        cursor.connection.commit()
+        synced = set(cursor.execute('SELECT * FROM edits'))
+        cards, seconds = cursor.execute(CARDS).fetchall(), seconds_per_card(cursor)
+        assert Compactor(cursor).compact() == 5 * 2
+        # nothing new to push, and every edit left is as the server has it but for its seconds
+        assert cursor.execute('SELECT count(*) FROM edits WHERE server_timestamp IS NULL').fetchone()[0] == 0
+        without_seconds = lambda rows: {row[:3] + row[4:] for row in rows}
+        assert without_seconds(cursor.execute('SELECT * FROM edits')) <= without_seconds(synced)
+        assert seconds_per_card(cursor) == seconds
+        assert cursor.execute(CARDS).fetchall() == cards
+        assert CardState(cursor).verify() == 'card state is consistent'
+
+
+def test_compaction_shrinks_the_log_and_the_push(cursor):
+        card_id = some_cards(cursor, 1)[0]
+        retype(cursor, card_id, 20)
+        cursor.execute('UPDATE edits SET server_timestamp = 100')
+        set_checkpoint(cursor, 100)
+        retype(cursor, card_id, 5, start=today() + 2)
+        count = lambda where: cursor.execute(f'SELECT count(*) FROM edits WHERE card_id = ? {where}',
+                                             (card_id,)).fetchone()[0]
+        edits, pushed, seconds = count(''), count('AND server_timestamp IS NULL'), seconds_per_card(cursor)
+        assert Compactor(cursor).compact() == 19 + 4
+        assert (count(''), count('AND server_timestamp IS NULL')) == (edits - 23, pushed - 4)
+        assert seconds_per_card(cursor) == seconds
+        assert CardState(cursor).verify() == 'card state is consistent'
+
+
+def test_unsynced_seconds_go_to_an_unsynced_edit(cursor):
+        card_id = some_cards(cursor, 1)[0]
+        cursor.execute('UPDATE edits SET server_timestamp = 100')
+        cursor.connection.commit()
+        retype(cursor, card_id, 3)
+        before = cursor.execute('SELECT count(*), sum(seconds) FROM edits WHERE card_id = ?', (card_id,)).fetchone()
+        Compactor(cursor).coalesce_unsynced()
+        count, seconds = cursor.execute('SELECT count(*), sum(seconds) FROM edits WHERE card_id = ?', (card_id,)).fetchone()
+        assert (count, seconds) == (before[0] - 2, before[1])
+        assert cursor.execute('SELECT count(*) FROM edits WHERE server_timestamp = 100 AND card_id = ?',
+                              (card_id,)).fetchone()[0] == before[0] - 3
+
+
+def test_edit_setting_no_field_is_kept(cursor):
+        card_id = some_cards(cursor, 1)[0]
+        retype(cursor, card_id, 2)
+        cursor.execute('INSERT INTO edits (card_id, date, seconds) VALUES (?, ?, 30)', (card_id, today() + 2))
+        cursor.connection.commit()
+        Compactor(cursor).coalesce_unsynced()
+        assert cursor.execute('SELECT count(*) FROM edits WHERE card_id = ? AND date = ?',
+                              (card_id, today() + 2)).fetchone()[0] == 1
+
+
+def test_compaction_is_idempotent(cursor):
+        for card_id in some_cards(cursor):
+                retype(cursor, card_id, 3)
+        compactor = Compactor(cursor)
+        assert compactor.compact() == 10
+        assert compactor.compact() == 0
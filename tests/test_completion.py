@@ -0,0 +1,16 @@
+from vinca_CLI import _completion
+from vinca_CLI._completion import refresh_tags
+
+
+def test_tag_index_is_only_rewritten_when_tags_change(cursor, tmp_path, monkeypatch):
+        monkeypatch.setattr(_completion, 'INDEX_DIR', tmp_path / 'completion')
+        index = tmp_path / 'completion' / 'tags'
+        refresh_tags(cursor)
+        written = index.stat().st_mtime_ns
+        # reviews and edits which do not touch the tags leave the index alone
+        cursor.execute("INSERT INTO reviews (card_id, date, grade) SELECT id, 0, 'good' FROM card_state LIMIT 1")
+        refresh_tags(cursor)
+        assert index.stat().st_mtime_ns == written
+        cursor.execute("INSERT INTO tags VALUES ('zoology', 1)")
+        refresh_tags(cursor)
+        assert 'zoology\n' in index.read_text()
@@ -0,0 +1,69 @@
+import pytest
+from prompt_toolkit.application import create_app_session
+from prompt_toolkit.input import create_pipe_input
+from prompt_toolkit.output import DummyOutput
+
+from vinca_CLI import _entry
+from vinca_CLI._entry import add_cards, create_card
+
+CONFIRM = '\x1b\r'  # ESC-Enter ends a multiline prompt
+
+
+def card(question, answer):
+        return question + CONFIRM + answer + CONFIRM
+
+
+@pytest.fixture
+def typed():
+        """ send(text) makes text the keys typed at the prompts """
+        with create_pipe_input() as pipe, create_app_session(input=pipe, output=DummyOutput()):
+                yield pipe.send_text
+
+
+@pytest.fixture
+def writes(monkeypatch):
+        """ the number of cards in each call of insert_cards """
+        calls, insert_cards = [], _entry.insert_cards
+        def counted(cursor, rows):
+                calls.append(len(rows))
+                insert_cards(cursor, rows)
+        monkeypatch.setattr(_entry, 'insert_cards', counted)
+        return calls
+
+
+def cards_with_tags(cursor, tags):
+        return cursor.execute('SELECT front_text, back_text FROM edits WHERE tags = ? ORDER BY date',
+                              (tags,)).fetchall()
+
+
+def test_empty_question_ends_and_cards_are_written_in_batches(cursor, typed, writes):
+        typed('new\r' + card('q1', 'a1') + card('q2', 'a2') + card('q3', 'a3') + CONFIRM)
+        assert add_cards(cursor, batch=2) == 3
+        assert writes == [2, 1]
+        assert cards_with_tags(cursor, 'new') == [('q1', 'a1'), ('q2', 'a2'), ('q3', 'a3')]
+
+
+@pytest.mark.parametrize('key', ['\x03', '\x04'])  # Ctrl-C, Ctrl-D
+def test_leaving_the_loop_keeps_typed_cards(cursor, typed, writes, key):
+        typed(card('q1', 'a1') + key)
+        assert add_cards(cursor, tags='new', batch=5) == 1
+        assert cards_with_tags(cursor, 'new') == [('q1', 'a1')]
+
+
+def test_a_failed_write_is_not_repeated(cursor, typed, monkeypatch):
+        calls = []
+        def failing(cursor, rows):
+                calls.append(rows)
+                raise OSError('disk full')
+        monkeypatch.setattr(_entry, 'insert_cards', failing)
+        typed(card('q1', 'a1') + card('q2', 'a2') + CONFIRM)
+        with pytest.raises(OSError):
+                add_cards(cursor, tags='new', batch=2)
+        assert len(calls) == 1
+
+
+def test_create_card_with_an_empty_question_writes_nothing(cursor, typed):
+        edits = cursor.execute('SELECT count(*) FROM edits').fetchone()[0]
+        typed(CONFIRM)
+        assert create_card(cursor) is None
+        assert cursor.execute('SELECT count(*) FROM edits').fetchone()[0] == edits
@@ -0,0 +1,60 @@
+from io import BytesIO
+
+from PIL import Image
+
+from vinca_CLI import _media
+from vinca_CLI._media import Media, ingest_image, normalize_image
+from vinca_CLI._config import max_image_size
+
+
+def bmp(width=1500, height=600):
+        """ an uncompressed image larger than max_image_size """
+        buffer = BytesIO()
+        Image.linear_gradient('L').resize((width, height)).convert('RGB').save(buffer, format='BMP')
+        return buffer.getvalue()
+
+
+def show(cursor, card_id, content, synced=False):
+        """ store an image as its own blob and put it on the front of a card """
+        cursor.execute('INSERT INTO media (content, server_timestamp) VALUES (?, ?)', (content, 100 if synced else None))
+        media_id = cursor.execute('SELECT id FROM media WHERE rowid = last_insert_rowid()').fetchone()[0]
+        cursor.execute('INSERT INTO edits (card_id, front_image_id) VALUES (?, ?)', (card_id, media_id))
+        cursor.connection.commit()
+        return media_id
+
+
+def front_image_id(cursor, card_id):
+        return cursor.execute('SELECT front_image_id FROM cards WHERE id = ?', (card_id,)).fetchone()[0]
+
+
+def test_normalize_image_makes_a_small_png():
+        png = normalize_image(bmp())
+        image = Image.open(BytesIO(png))
+        assert image.format == 'PNG' and max(image.size) == max_image_size
+        assert normalize_image(png) == png
+        assert normalize_image(b'not an image') == b'not an image'
+
+
+def test_ingest_image_keeps_the_original(tmp_path, monkeypatch):
+        monkeypatch.setattr(_media, 'originals_path', str(tmp_path / 'originals'))
+        path = tmp_path / 'photo.BMP'
+        path.write_bytes(bmp())
+        assert Image.open(BytesIO(ingest_image(path))).format == 'PNG'
+        [original] = (tmp_path / 'originals').iterdir()
+        assert original.suffix == '.bmp' and original.read_bytes() == path.read_bytes()
+
+
+def test_optimize_replaces_images_and_keeps_synced_blobs(cursor):
+        cards = [row[0] for row in cursor.execute('SELECT id FROM card_state ORDER BY id LIMIT 3')]
+        unsynced = show(cursor, cards[0], bmp())
+        duplicate = show(cursor, cards[1], bmp())
+        synced = show(cursor, cards[2], bmp(1400), synced=True)
+        media = cursor.execute('SELECT count(*) FROM media').fetchone()[0]
+        assert Media(cursor).optimize(workers=1).startswith('3 of')
+        new = [front_image_id(cursor, card_id) for card_id in cards]
+        # the two identical images now share one blob
+        assert new[0] == new[1] and new[2] not in (new[0], synced)
+        kept = {row[0] for row in cursor.execute('SELECT id FROM media')}
+        assert unsynced not in kept and duplicate not in kept and synced in kept
+        # two unsynced blobs deleted, two optimized ones added
+        assert cursor.execute('SELECT count(*) FROM media').fetchone()[0] == media
@@ -0,0 +1,94 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from benchmarks.generate import generate
+from vinca_CLI._card_state import CardState
+from vinca_CLI._card_stats import build_sql
+from vinca_CLI._lib.julianday import today
+from vinca_CLI._merge import merge, TRIGGERS
+
+CONSISTENT = 'card state is consistent'
+
+
+def other_device(cursor, tmp_path):
+        """ a copy of the collection with one more review of a card that is already here """
+        other = tmp_path / 'henry.sqlite'
+        cursor.connection.commit()
+        shutil.copy(cursor.connection.execute('PRAGMA database_list').fetchone()[2], other)
+        connection = sqlite3.connect(other)
+        card_id = connection.execute('SELECT card_id FROM reviews LIMIT 1').fetchone()[0]
+        with connection:
+                connection.execute("INSERT INTO reviews (card_id, date, seconds, grade) VALUES (?, ?, 5, 'again')",
+                                   (card_id, today()))
+        connection.close()
+        return other, card_id
+
+
+def stats_agree(cursor):
+        # card_id, reviews, lapses, last_grades and score_total of every card
+        rows = lambda source: [row[:3] + row[5:7] for row in cursor.execute(f'{source} ORDER BY card_id')]
+        return rows('SELECT * FROM card_stats') == rows(f'SELECT * FROM ({build_sql("reviews")})')
+
+
+def test_merged_cards_are_consistent(cursor, tmp_path):
+        generate(tmp_path / 'other.sqlite', cards=50, tags=8, images=0, years=2, seed=1)
+        counts = merge(cursor, tmp_path / 'other.sqlite')
+        assert counts['new cards'] == 50 and counts['edits'] and counts['reviews']
+        assert CardState(cursor).verify() == CONSISTENT
+        assert stats_agree(cursor)
+        # merging the same file again adds nothing
+        assert not any(merge(cursor, tmp_path / 'other.sqlite').values())
+
+
+def test_merged_review_reschedules_in_one_transaction(cursor, tmp_path):
+        other, card_id = other_device(cursor, tmp_path)
+        statements = []
+        cursor.connection.set_trace_callback(statements.append)
+        counts = merge(cursor, other)
+        cursor.connection.set_trace_callback(None)
+        assert (counts['reviews'], counts['cards changed'], counts['rescheduled']) == (1, 1, 1)
+        # one commit, after the last statement of the merge
+        assert statements.count('COMMIT') == 1
+        assert statements.index('COMMIT') > statements.index('DROP TABLE temp.merged_cards')
+        assert CardState(cursor).verify() == CONSISTENT
+        assert stats_agree(cursor)
+        # the review was graded 'again': the card is due again soon
+        due_date = cursor.execute('SELECT due_date FROM card_state WHERE id = ?', (card_id,)).fetchone()[0]
+        assert due_date < today() + 2
+
+
+def test_other_triggers_run_and_a_failed_merge_changes_nothing(cursor, tmp_path):
+        other, card_id = other_device(cursor, tmp_path)
+        cursor.execute('CREATE TABLE merged_reviews (card_id)')
+        cursor.execute('CREATE TRIGGER log_review AFTER INSERT ON reviews '
+                       'BEGIN INSERT INTO merged_reviews VALUES (new.card_id); END')
+        # a trigger which rejects the due date edit written at the very end of the merge
+        cursor.execute('CREATE TRIGGER reject AFTER INSERT ON edits WHEN new.due_date IS NOT NULL '
+                       "AND new.front_text IS NULL BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+        cursor.connection.commit()
+        reviews = cursor.execute('SELECT count(*) FROM reviews').fetchone()[0]
+        with pytest.raises(sqlite3.IntegrityError):
+                merge(cursor, other)
+        assert cursor.execute('SELECT count(*) FROM reviews').fetchone()[0] == reviews
+        assert cursor.execute('SELECT count(*) FROM merged_reviews').fetchone()[0] == 0
+        names = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        assert set(TRIGGERS) | {'log_review', 'reject'} <= names
+
+        cursor.execute('DROP TRIGGER reject')
+        cursor.connection.commit()
+        merge(cursor, other)
+        assert cursor.execute('SELECT card_id FROM merged_reviews').fetchall() == [(card_id,)]
+
+
+def test_a_file_which_is_not_a_collection_is_refused_every_time(cursor, tmp_path):
+        notes = tmp_path / 'notes.sqlite'
+        for path in (notes, tmp_path / 'notes.archive.sqlite'):
+                with sqlite3.connect(path) as connection:
+                        connection.execute('CREATE TABLE notes (text)')
+        for attempt in range(2):
+                with pytest.raises(ValueError):
+                        merge(cursor, notes)
+        attached = {row[1] for row in cursor.execute('PRAGMA database_list')}
+        assert not attached & {'other', 'other_archive'}
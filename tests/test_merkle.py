@@ -0,0 +1,73 @@
+import shutil
+import sqlite3
+
+from benchmarks.generate import MESSENGER_TEMPLATE
+from vinca_CLI._archive import Archive
+from vinca_CLI._card_state import CardState
+from vinca_CLI._card_stats import build_sql, reviews_source
+from vinca_CLI._compaction import Compactor, set_checkpoint
+from vinca_CLI._merkle import TABLES, Peer, LocalPeer, Verification
+from vinca_CLI._lib.julianday import today
+
+
+def synced(cursor):
+        for table in TABLES:
+                cursor.execute(f'UPDATE {table} SET server_timestamp = 100')
+        set_checkpoint(cursor, 100)
+        cursor.connection.commit()
+
+
+def server_copy(cursor, path):
+        """ a database holding only the log tables, as the sync server's does """
+        shutil.copy(MESSENGER_TEMPLATE, path)
+        cursor.execute('ATTACH DATABASE ? AS server', (str(path),))
+        for table in TABLES:
+                source = reviews_source(cursor) if table == 'reviews' else f'main.{table}'
+                cursor.execute(f'INSERT INTO server.{table} SELECT * FROM {source}')
+        cursor.connection.commit()
+        cursor.execute('DETACH DATABASE server')
+        return path
+
+
+def differences(cursor, server):
+        verification = Verification(Peer(cursor), LocalPeer(server))
+        return {table: verification.diff(table) for table in TABLES}, verification
+
+
+def test_server_copy_matches(cursor, tmp_path):
+        synced(cursor)
+        server = server_copy(cursor, tmp_path / 'server.sqlite')
+        found, verification = differences(cursor, server)
+        assert all(diff == (set(), set(), set()) for diff in found.values())
+        assert verification.round_trips == len(TABLES)
+
+
+def test_compaction_is_invisible_to_digests(cursor, tmp_path):
+        card_ids = [row[0] for row in cursor.execute('SELECT id FROM card_state LIMIT 5')]
+        for card_id in card_ids:
+                for i in range(3):
+                        cursor.execute("INSERT INTO edits (card_id, date, seconds, front_text) VALUES (?, ?, 7, 'q')",
+                                       (card_id, today() + 1 + i / 10))
+        synced(cursor)
+        server = server_copy(cursor, tmp_path / 'server.sqlite')
+        assert Compactor(cursor).compact() == 10
+        found, verification = differences(cursor, server)
+        assert all(diff == (set(), set(), set()) for diff in found.values())
+
+
+def test_archived_review_lost_by_the_server_is_uploaded_again(cursor, tmp_path):
+        synced(cursor)
+        Archive(cursor).move(days=30)
+        server = server_copy(cursor, tmp_path / 'server.sqlite')
+        lost, card_id = cursor.execute('SELECT id, card_id FROM archive.reviews LIMIT 1').fetchone()
+        with sqlite3.connect(server) as connection:
+                connection.execute('DELETE FROM reviews WHERE id = ?', (lost,))
+        found, verification = differences(cursor, server)
+        assert found['reviews'] == (set(), {lost}, set())
+        verification.repair('reviews', *found['reviews'])
+        # only live reviews are uploaded, so the review is back in the collection, unsynced
+        assert cursor.execute('SELECT server_timestamp FROM main.reviews WHERE id = ?', (lost,)).fetchone() == (None,)
+        assert cursor.execute('SELECT count(*) FROM archive.reviews WHERE id = ?', (lost,)).fetchone()[0] == 0
+        stats = cursor.execute('SELECT * FROM card_stats WHERE card_id = ?', (card_id,)).fetchone()
+        assert stats == cursor.execute(f'{build_sql(reviews_source(cursor), str(card_id))}').fetchone()
+        assert CardState(cursor).verify() == 'card state is consistent'
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+from prompt_toolkit.application import create_app_session
+from prompt_toolkit.input import create_pipe_input
+from prompt_toolkit.output import DummyOutput
+
+from vinca_CLI._entry import Session
+from vinca_CLI._lib import readkey
+from vinca_CLI._lib.readkey import KeyReader
+
+
+class PipeReader(KeyReader):
+        """ reads keys from a pipe instead of the terminal """
+
+        fd = None
+
+        def __init__(self, data):
+                super().__init__()
+                self.fd, writer = os.pipe()
+                os.write(writer, data)
+                os.close(writer)
+
+
+def test_end_of_input_raises_eof_error():
+        reader = PipeReader(b'j\x1b[Ak\x1b')
+        assert [reader.readkey() for _ in range(4)] == ['j', readkey.keys.UP, 'k', readkey.keys.ESC]
+        with pytest.raises(EOFError):
+                reader.readkey()
+        os.close(reader.fd)
+
+
+def test_a_prompt_discards_the_keys_read_ahead(monkeypatch):
+        monkeypatch.setattr(readkey, 'reader', KeyReader())
+        readkey.reader.pending = 'dd'
+        with create_pipe_input() as pipe, create_app_session(input=pipe, output=DummyOutput()):
+                pipe.send_text('tag\r')
+                assert Session().prompt('tags: ') == 'tag'
+        assert readkey.reader.pending == ''
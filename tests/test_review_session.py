@@ -0,0 +1,57 @@
+from vinca_CLI._CLI_cardlist import CLI_Cardlist
+from vinca_CLI._lib.julianday import now, today
+from vinca_CLI import _review_session
+from vinca_CLI._review_session import ReviewSession
+
+AGAIN, GOOD = '1', '3'
+
+
+def study(cursor, reviews=6, new=3):
+        """ make some reviewed cards due and add some new cards """
+        reviewed = [row[0] for row in cursor.execute('SELECT id FROM card_state WHERE last_review_date IS NOT NULL '
+                                                     'AND due_date > ? LIMIT ?', (today(), reviews))]
+        for days, card_id in enumerate(reviewed, start=1):
+                cursor.execute('INSERT INTO edits (card_id, due_date) VALUES (?, ?)', (card_id, today() - days))
+        for i in range(new):
+                cursor.execute("INSERT INTO edits (card_id, date, front_text, back_text) VALUES (?, ?, 'q', 'a')",
+                               (10**9 + i, today() - 1 + i / 100))
+        cursor.connection.commit()
+
+
+def is_new(card):
+        return card.last_review_date is None
+
+
+def test_new_cards_are_interleaved(cursor):
+        study(cursor)
+        session = ReviewSession(CLI_Cardlist(cursor), new_card_interval=2)
+        served = list(session)
+        assert [is_new(card) for card in served[:9]] == [False, False, True] * 3
+        assert len({card.id for card in served}) == len(served)
+
+
+def test_again_comes_back_once_after_the_delay(cursor, monkeypatch):
+        # small batches, so that the stream reads the cards again after the first review
+        monkeypatch.setattr(_review_session, 'BATCH_SIZE', 2)
+        study(cursor)
+        session = ReviewSession(CLI_Cardlist(cursor), new_card_interval=0, relearn_delay=3600)
+        first = session.next_card()
+        session.answer(first, AGAIN)
+        # reviewing it again leaves it due now, where the review stream would meet it again
+        cursor.execute('INSERT INTO edits (card_id, due_date) VALUES (?, ?)', (first.id, now() - 0.001))
+        cursor.connection.commit()
+        served = [first]
+        while (card := session.next_card()) is not None:
+                session.answer(card, GOOD)
+                served.append(card)
+        ids = [card.id for card in served]
+        assert ids.count(first.id) == 2 and ids[-1] == first.id
+        assert not session.relearning and not session.relearning_ids
+
+
+def test_again_comes_back_when_its_delay_is_over(cursor):
+        study(cursor)
+        session = ReviewSession(CLI_Cardlist(cursor), relearn_delay=0)
+        first = session.next_card()
+        session.answer(first, AGAIN)
+        assert session.next_card().id == first.id
@@ -0,0 +1,54 @@
+from vinca_core.scheduling import Review, History
+
+from vinca_CLI._scheduling import reschedule, card_states, due_date
+from vinca_CLI._lib.julianday import today
+
+
+def test_generated_schedule_is_up_to_date(cursor):
+        assert reschedule(cursor, dry_run=True) == []
+
+
+def test_new_cards_stay_new(cursor):
+        cursor.execute('INSERT INTO edits (card_id, date, front_text) VALUES (1, ?, ?)', (today() - 3, 'new card'))
+        cursor.connection.commit()
+        assert reschedule(cursor, 'SELECT 1', dry_run=True) == []
+        reschedule(cursor)
+        due, created = cursor.execute('SELECT due_date, create_date FROM card_state WHERE id = 1').fetchone()
+        assert due == created
+
+
+def test_reviewed_card_follows_history(cursor):
+        card_id, create_date = cursor.execute('SELECT id, create_date FROM card_state LIMIT 1').fetchone()
+        cursor.execute("INSERT INTO reviews (card_id, date, seconds, grade) VALUES (?, ?, 5, 'hard')",
+                       (card_id, today() + 0.5))
+        cursor.connection.commit()
+        [(id, old, new)] = reschedule(cursor, str(card_id))
+        reviews = [Review(*row) for row in cursor.execute('SELECT date, grade, seconds FROM reviews WHERE card_id = ?',
+                                                          (card_id,))]
+        assert new == History(reviews, create_date=create_date).new_due_date
+        assert cursor.execute('SELECT due_date FROM card_state WHERE id = ?', (card_id,)).fetchone()[0] == new
+
+
+def test_card_states_agree_with_history(cursor):
+        states = card_states(cursor)
+        reviews = {}
+        for card_id, date, grade, seconds in cursor.execute('SELECT card_id, date, grade, seconds FROM reviews'):
+                reviews.setdefault(card_id, []).append(Review(date, grade, seconds))
+        assert reviews
+        for card_id, history in reviews.items():
+                create_date = states[card_id][0]
+                assert due_date(*states[card_id]) == History(history, create_date=create_date).new_due_date
+
+
+def test_last_grade_does_not_depend_on_row_order(cursor):
+        card_id = cursor.execute('SELECT id FROM card_state LIMIT 1').fetchone()[0]
+        date = today() + 0.5
+        states = []
+        for order in ((1, 'easy'), (2, 'again')), ((2, 'again'), (1, 'easy')):
+                cursor.execute('DELETE FROM reviews WHERE card_id = ? AND date = ?', (card_id, date))
+                for id, grade in order:
+                        cursor.execute('INSERT INTO reviews (id, card_id, date, seconds, grade) VALUES (?, ?, ?, 5, ?)',
+                                       (id, card_id, date, grade))
+                states.append(card_states(cursor, str(card_id))[card_id])
+        assert states[0][2] == states[1][2] == date
+        assert states[0][3] == states[1][3]
@@ -0,0 +1,35 @@
+import sqlite3
+
+from vinca_CLI._space import Space, make_incremental, reclaimable
+
+
+def collection_with_free_pages(path):
+        cursor = sqlite3.connect(path).cursor()
+        make_incremental(cursor)
+        cursor.execute('DELETE FROM media')
+        cursor.connection.commit()
+        assert reclaimable(cursor)
+        cursor.connection.close()
+
+
+def test_reclaim_gives_back_every_free_page(collection_file):
+        path = collection_file
+        collection_with_free_pages(path)
+        cursor = sqlite3.connect(path).cursor()
+        assert 'left' not in Space(cursor).reclaim(pages=8)
+        assert reclaimable(cursor) == 0
+
+
+def test_reclaim_stops_while_another_connection_writes(collection_file):
+        path = collection_file
+        collection_with_free_pages(path)
+        writer = sqlite3.connect(path, isolation_level=None)
+        writer.execute('BEGIN IMMEDIATE')
+        writer.execute("INSERT INTO reviews (card_id, grade) VALUES (1, 'good')")
+        cursor = sqlite3.connect(path, timeout=0.01).cursor()
+        free = reclaimable(cursor)
+        report = Space(cursor).reclaim()
+        assert report.startswith('0 B reclaimed') and 'busy' in report
+        writer.execute('COMMIT')
+        Space(cursor).reclaim()
+        assert reclaimable(cursor) == 0 < free
@@ -0,0 +1,51 @@
+import os
+import random
+
+from benchmarks.generate import png
+from vinca_CLI._lib import terminal_graphics
+from vinca_CLI._lib.terminal_graphics import TerminalImage, render, prune_cache
+from vinca_CLI._CLI_card import CLI_Card
+
+
+def test_card_image_is_drawn(cursor, tmp_path, monkeypatch, capsys):
+        monkeypatch.setattr(terminal_graphics, 'CACHE_DIR', tmp_path / 'renders')
+        monkeypatch.setenv('VINCA_IMAGE_PROTOCOL', 'halfblock')
+        card_id, content = cursor.execute('SELECT card_state.id, content FROM card_state '
+                                          'JOIN media ON media.id = front_image_id LIMIT 1').fetchone()
+        card = CLI_Card(card_id, cursor)
+        assert card.front_image == content
+        with TerminalImage(data_bytes=card.front_image):
+                pass
+        assert '▀' in capsys.readouterr().out
+
+
+def test_card_without_image(cursor):
+        card_id = cursor.execute('SELECT id FROM card_state WHERE front_image_id IS NULL LIMIT 1').fetchone()[0]
+        assert CLI_Card(card_id, cursor).front_image is None
+
+
+def test_one_pixel_tall_image(tmp_path, monkeypatch):
+        monkeypatch.setattr(terminal_graphics, 'CACHE_DIR', tmp_path)
+        image = png(random.Random(0), 7, 1)
+        for protocol in ('quadrant', 'halfblock', 'sixel', 'kitty'):
+                assert render(image, columns=80, lines=24, protocol_name=protocol)
+
+
+def test_render_cache_keeps_recent_files(tmp_path, monkeypatch):
+        monkeypatch.setattr(terminal_graphics, 'CACHE_DIR', tmp_path)
+        for age in range(5):
+                path = tmp_path / f'render-{age}'
+                path.write_bytes(b'x' * 100)
+                os.utime(path, (1000 - age, 1000 - age))
+        prune_cache(max_bytes=250)
+        assert sorted(path.name for path in tmp_path.iterdir()) == ['render-0', 'render-1']
+
+
+def test_memory_cache_is_bounded(tmp_path, monkeypatch):
+        monkeypatch.setattr(terminal_graphics, 'CACHE_DIR', tmp_path)
+        monkeypatch.setattr(terminal_graphics, 'MEMORY_RENDERS', 2)
+        monkeypatch.setattr(terminal_graphics, '_cache', terminal_graphics.OrderedDict())
+        image = png(random.Random(0), 4, 4)
+        for columns in (20, 30, 20, 40):
+                render(image, columns=columns, lines=24, protocol_name='quadrant')
+        assert [key[1] for key in terminal_graphics._cache] == [20, 40]
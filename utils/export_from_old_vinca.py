@@ -2,6 +2,7 @@
 import ovinca  # old vinca
 import vinca._cli_objects as vinca
 from vinca._card import Card
+from vinca_CLI._scheduling import reschedule
 import sqlite3
 curs = sqlite3.connect(':memory:').cursor()
 
@@ -29,6 +30,7 @@ for oc in ovinca.collection[1714:]:
             juliandate = curs.execute('SELECT julianday(?, "localtime") + 0.5', (str(h.date) + ' 00:00:00',)).fetchone()[0]
             vinca.col._cursor.execute('INSERT INTO reviews (date, seconds, action_grade, card_id) VALUES (?, ?, ?, ?)', (juliandate, h.time, h.grade, nc.id))
             vinca.col._cursor.connection.commit()
-    # schedule according to new system
-    nc._schedule()
+
+# schedule according to new system, all cards in one pass
+reschedule(vinca.col._cursor)
 
@@ -1,18 +1,38 @@
 import time
 from pathlib import Path
 
-from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
-
 from rich import print
 
 from vinca_CLI._lib.terminal import AlternateScreen
 from vinca_CLI._lib.readkey import readkey
-from vinca_CLI._lib.video import DisplayImage
+from vinca_CLI._lib.terminal_graphics import TerminalImage, x11_available
 from vinca_CLI._lib import ansi
+from vinca_CLI._config import image_backend
+from vinca_CLI._media import ingest_image
+from vinca_CLI._entry import prompts, MAX_SECONDS
+from vinca_CLI._scheduling import card_states, hypothetical_due_dates
+from vinca_CLI._lib.julianday import JulianDate
+from vinca_CLI import _card_state
+from vinca_CLI import _profile
+from vinca_CLI import _card_stats
 
 from vinca_core.card import Card
 
+# tkinter is only imported if we are going to draw images in an X window
+if image_backend == 'x11' or (image_backend == 'auto' and x11_available()):
+    from vinca_CLI._lib.video import DisplayImage
+else:
+    DisplayImage = TerminalImage
+
+
+class TimedImage(DisplayImage):
+    # records how long drawing an image takes: `vinca stats`
+    def __enter__(self):
+        if not (self.data_bytes or self.image_path):
+            return super().__enter__()
+        with _profile.timer('image display'):
+            return super().__enter__()
+
 GRADE_DICT = {'1': 'again',
               '2': 'hard',
               '3': 'good', ' ': 'good', '\r': 'good', '\n': 'good',
@@ -28,6 +48,12 @@ class CLI_Card(Card):
             s += f'({i}) {grade:8s}+{hypo_due_date} days from today\n'
         return s
 
+    def hypo_due_dates(self, date=None):
+        # relative hypothetical due dates, e.g. +10 days if you press 'hard'
+        # computed from one aggregate over the reviews instead of the full history
+        state = card_states(self._cursor, str(int(self.id)))[self.id]
+        return hypothetical_due_dates(*state, date=date)
+
     @property
     def _hotkeys(self):
         return {'e': self.edit,
@@ -35,8 +61,36 @@ class CLI_Card(Card):
                 'd': self._toggle_delete,
                 '+': self.postpone, }
 
+    def review_stats(self):
+        """ reviews, lapses, seconds and recent grades of this card """
+        row = _card_stats.card_row(self._cursor, self.id)
+        if row is None:
+            return 'no reviews'
+        del row['card_id'], row['score_total']
+        return row
+
+    # set by many(), which looks up the leeches of a whole list at once
+    _leech = None
+
+    @classmethod
+    def many(cls, ids, cursor):
+        """ the cards of ids, as shown in a list """
+        leeches = _card_stats.leeches(cursor, ids)
+        cards = [cls(id, cursor) for id in ids]
+        for card in cards:
+            card._leech = card.id in leeches
+        return cards
+
+    @property
+    def is_leech(self):
+        if self._leech is None:
+            self._leech = bool(_card_stats.leeches(self._cursor, [self.id]))
+        return self._leech
+
     def __str__(self):
         s = ''
+        if self.is_leech:
+            s += '⚑ '
         if self.visibility=='deleted':
             s += ansi.codes['red']
         elif self.is_due:
@@ -47,6 +101,24 @@ class CLI_Card(Card):
         s += ansi.codes['reset']
         return s
 
+    def __getitem__(self, key):
+        # the first field we ask for loads all fields with one lookup in card_state
+        if key not in self._dict and key in _card_state.COLUMNS and \
+           _card_state.source(self._cursor) == 'card_state':
+            columns = ', '.join(_card_state.COLUMNS)
+            row = self._cursor.execute(f'SELECT {columns} FROM card_state WHERE id = ?', (self.id,)).fetchone()
+            for field, value in zip(_card_state.COLUMNS, row or ()):
+                if field in self._date_fields and value is not None:
+                    value = JulianDate(value)
+                self._dict.setdefault(field, value)
+        return super().__getitem__(key)
+
+    def _get_virtual_media_field(self, key):
+        # front_image is the content of the media row that front_image_id points to
+        # (vinca_core's lookup finds it but does not return it)
+        media_id = self[key + '_id']
+        return self._get_media(self._cursor, media_id) if media_id else None
+
     def metadata(self):
         metadata = {field: str(getattr(self, field)) for field in self._fields}
         return metadata
@@ -69,7 +141,9 @@ class CLI_Card(Card):
         # if a filename is specified as the value read the contents of that file.
         if key in self._text_fields and self._is_path(value):
             value = Path(value).read_text()
-        if key in self._virtual_media_fields and self._is_path(value):
+        if key in ('front_image', 'back_image') and self._is_path(value):
+            value = ingest_image(value)  # converted to a downsized PNG
+        elif key in self._virtual_media_fields and self._is_path(value):
             value = Path(value).read_bytes()
         self.__setitem__(key, value)
 
@@ -91,16 +165,19 @@ class CLI_Card(Card):
         return 'card restored'
 
     def review(self):
+        _profile.start('review render')
         start = time.time()
         grade_key = self._review_verses() if self.card_type=='verses' else self._review_basic()
         stop = time.time()
+        _profile.start('key to next card')  # until the next card is shown
         elapsed_seconds = int(stop - start)
 
         if grade_key in ('d','\x1b[P'): # 'd' or 'Delete' keys
                 self.visibility = 'deleted'
         if grade := GRADE_DICT.get(grade_key):
-                self._log(grade=grade, seconds=elapsed_seconds)
-                self._schedule()
+                with _profile.timer('review write'):
+                    self._log(grade=grade, seconds=elapsed_seconds)
+                    self._schedule()
         return grade_key
 
     def _review_basic(self):
@@ -115,7 +192,8 @@ class CLI_Card(Card):
         with AlternateScreen():
             print(f'[bold]{self.front_text}')
             print('\n', f'[dim yellow italic]{self.tags}', '\n', sep='')
-            with DisplayImage(data_bytes=self.front_image):
+            with TimedImage(data_bytes=self.front_image):
+                _profile.stop('review render', 'key to next card')
                 char = readkey()  # press any key to flip the card
                 if char == 'e':  # edit the card and then review it
                     return edit_then_review()
@@ -123,7 +201,7 @@ class CLI_Card(Card):
                     self.edit_tags()
                 if char in ('d', '\x1b[P', 'q', '\x1b'): # immediate exit actions
                     return char
-            with DisplayImage(data_bytes=self.back_image):
+            with TimedImage(data_bytes=self.back_image):
                 print(f'[bold]{self.back_text}')
                 print('\n\n')
                 print(self.help_string)
@@ -146,6 +224,7 @@ class CLI_Card(Card):
             print(f'[dim yellow italic]{self.tags}', '\n', sep='')
             lines = self.front_text.splitlines()
             print(f'[bold]{lines.pop(0)}')
+            _profile.stop('review render', 'key to next card')
             for line in lines:
                 char = readkey()  # press any key to continue
                 if char == 'e':  # edit the card and then review it
@@ -170,30 +249,19 @@ class CLI_Card(Card):
         self._edit_verses() if self.card_type=='verses' else self._edit_basic()
 
     def _edit_basic(self):
+        ask = prompts(self._cursor)
         start = time.time()
-        front_text = prompt('Question:   ',
-                             default=self.front_text,
-                             multiline=True, vi_mode=True,
-                             bottom_toolbar=lambda: 'press ESC-Enter to confirm')
-        back_text = prompt('Answer:     ',
-                            default=self.back_text,
-                            multiline=True, vi_mode=True,
-                            bottom_toolbar=lambda: 'press ESC-Enter to confirm')
-        elapsed = min(120, time.time() - start)
+        front_text = ask.question.prompt('Question:   ', default=self.front_text)
+        back_text = ask.answer.prompt('Answer:     ', default=self.back_text)
+        elapsed = min(MAX_SECONDS, time.time() - start)
         self._update({'front_text': front_text, 'back_text': back_text}, seconds=elapsed)
 
     def _edit_verses(self):
         start = time.time()
-        self.front_text = prompt('Verses:     ',
-                                 default=self.front_text,
-                                 multiline=True, vi_mode=True,
-                                 bottom_toolbar=lambda: 'press ESC-Enter to confirm')
-        elapsed = min(120, time.time() - start)
+        front_text = prompts(self._cursor).verses.prompt('Verses:     ', default=self.front_text)
+        elapsed = min(MAX_SECONDS, time.time() - start)
         self._update({'front_text': front_text}, seconds=elapsed)
 
 
     def edit_tags(self, new_tags=None):
-            self.tags = prompt('tags: ',
-                              default=self.tags,
-                              completer=WordCompleter(self._collection_tags()),
-                              )
+            self.tags = new_tags if new_tags is not None else prompts(self._cursor).ask_tags(default=self.tags)
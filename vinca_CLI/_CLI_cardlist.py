@@ -1,25 +1,95 @@
 from vinca_CLI._CLI_card import CLI_Card
 from vinca_CLI._browser import Browser
 from vinca_CLI._lib import ansi
-from vinca_CLI._lib.readkey import readkey
+from vinca_CLI._lib.readkey import readkey, raw_terminal, keys
+from vinca_CLI._lib.julianday import now, JulianDate
 from vinca_CLI._statistics import Statistics
+from vinca_CLI._review_session import ReviewSession
+from vinca_CLI._scheduling import reschedule
+from vinca_CLI import _card_state
+from vinca_CLI._space import reclaimable, human_size
+from vinca_CLI._config import leech_lapses, entry_batch
+from vinca_CLI._entry import create_card, add_cards
 
 from vinca_core.cardlist import Cardlist
 
+from array import array
 import datetime
+import inspect
 
 from rich import print
 
+
+class CardSequence:
+        """ A compact list of card ids.
+        Cards are only constructed when they are accessed. """
+
+        def __init__(self, ids, cursor):
+                self.ids = ids
+                self._cursor = cursor
+
+        def __len__(self):
+                return len(self.ids)
+
+        def __getitem__(self, arg):
+                if type(arg) is slice:
+                        return CLI_Card.many(self.ids[arg], self._cursor)
+                return CLI_Card(self.ids[arg], self._cursor)
+
+        def __iter__(self):
+                return (CLI_Card(id, self._cursor) for id in self.ids)
+
+        def insert(self, index, card):
+                self.ids.insert(index, card.id)
+
+
 class CLI_Cardlist(Cardlist):
 
+        # A Cardlist is only a WHERE clause and an ORDER BY clause.
+        # filter and sort return new Cardlists without touching the database,
+        # so a chain like col.filter(tag='x').filter(due=True).sort('old')
+        # is compiled into one statement when it is finally read.
+
+        @property
+        def _FROM(self):
+                # the card_state table holds the same columns as the cards view
+                # but reads them from a table instead of replaying the logs
+                return f' FROM {_card_state.source(self._cursor)} AS cards'
+
+        @property
+        def _SELECT_IDS(self):
+                return 'SELECT id' + self._FROM + self._WHERE + self._ORDER_BY
+
+        def __len__(self):
+                return self._cursor.execute('SELECT COUNT(*)' + self._FROM + self._WHERE).fetchone()[0]
+
+        def ids(self, LIMIT = None):
+                """ the ids of the cards in compact form """
+                sql = self._SELECT_IDS + (f' LIMIT {int(LIMIT)}' if LIMIT is not None else '')
+                return array('q', (row[0] for row in self._cursor.execute(sql)))
 
         # overwrite Cardlist methods to return CLI_Cards instead of Cards
         def explicit_cards_list(self, LIMIT = 1000):
-                return [CLI_Card(card.id, card._cursor) for card in super().explicit_cards_list(LIMIT = LIMIT)]
+                return CLI_Card.many(self.ids(LIMIT = LIMIT), self._cursor)
 
         def __getitem__(self, arg):
-                card = super().__getitem__(arg)
-                return CLI_Card(card.id, card._cursor)
+                # human-oriented indexing beginning with 1, as in Cardlist
+                idx = arg.stop if type(arg) is slice else arg
+                if type(idx) is not int:
+                        raise ValueError
+                self._cursor.execute(self._SELECT_IDS + f' LIMIT 1 OFFSET {idx - 1}')
+                return CLI_Card(self._cursor.fetchone()[0], self._cursor)
+
+        def explain(self):
+                """ show the SQL for these cards and SQLite's plan for running it """
+                sql = self._SELECT_IDS
+                plan = self._cursor.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+                depth = {0: -1}
+                lines = [sql, '']
+                for id, parent, notused, detail in plan:
+                        depth[id] = depth.get(parent, -1) + 1
+                        lines.append('  ' * depth[id] + detail)
+                return '\n'.join(lines)
 
         def __str__(self):
                 sample_cards = self.explicit_cards_list(LIMIT=6)
@@ -32,23 +102,90 @@ class CLI_Cardlist(Cardlist):
 
         def browse(self):
                 """interactively manage you collection"""
-                Browser(self.explicit_cards_list(), self._make_basic_card, self._make_verses_card).browse()
+                Browser(CardSequence(self.ids(), self._cursor), self._make_basic_card, self._make_verses_card).browse()
 
-        def review(self):
+        def review(self, new_card_interval=None):
                 """review your cards"""
-                due_cards = self.filter(due = True).explicit_cards_list()
-                Browser(due_cards, self._make_basic_card, self._make_verses_card).review()
+                session = ReviewSession(self) if new_card_interval is None else \
+                          ReviewSession(self, new_card_interval=new_card_interval)
+                with raw_terminal():
+                        for card in session:
+                                grade_key = card.review()
+                                if grade_key in ('q', keys.ESC):
+                                        break
+                                session.answer(card, grade_key)
+                if not session.reviewed:
+                        return 'no cards to review'
+                return f'{session.reviewed} cards reviewed'
 
         def count(self):
                 """simple summary statistics"""
-                return {'total':  len(self),
-                        'due':    len(self.filter(due=True)),
-                        'new':    len(self.filter(new=True))}
+                # one pass over the cards rather than one query per number
+                total, due, new = self._cursor.execute(
+                        'SELECT count(*), total(due_date < ?), total(due_date = create_date)'
+                        + self._FROM + self._WHERE, (now(),)).fetchone()
+                counts = {'total':  total,
+                          'due':    int(due),
+                          'new':    int(new)}
+                if free := reclaimable(self._cursor):
+                        counts['reclaimable'] = human_size(free)  # `vinca reclaim`
+                return counts
+
+        def reschedule(self, dry_run=False):
+                """ recompute due dates from the review history """
+                changes = reschedule(self._cursor, self._SELECT_IDS, dry_run=dry_run)
+                if not changes:
+                        return 'all due dates are up to date'
+                earlier = sum(old is not None and new < old for id, old, new in changes)
+                if dry_run:
+                        print('[bold]card                          old due     new due')
+                        for id, old, new in changes[:20]:
+                                card = CLI_Card(id, self._cursor)
+                                text = card.front_text.replace('\n', ' / ')[:28]
+                                old = JulianDate(old) if old is not None else '-'
+                                print(f'{text:30s}{str(old):12s}{JulianDate(new)}')
+                        if len(changes) > 20:
+                                print(f'... and {len(changes) - 20} more')
+                verb = 'would move' if dry_run else 'moved'
+                return f'{len(changes)} cards {verb}: {earlier} earlier, {len(changes) - earlier} later'
+
+        def filter(self, *, leech=None, invert=False, **predicates):
+                """filter the collection (--leech: cards you keep forgetting)"""
+                # leech is read from the card_stats table; the other predicates are vinca_core's
+                if leech is not None:
+                        predicates.setdefault('require_parameters', False)
+                new_cardlist = super().filter(invert=invert, **predicates)
+                if leech is not None and leech != 'any' and not isinstance(new_cardlist, str):
+                        n = 'NOT ' if invert ^ (leech is False) else ''
+                        new_cardlist._conditions.append(
+                                f'{n}id IN (SELECT card_id FROM card_stats WHERE lapses >= {int(leech_lapses)})')
+                return new_cardlist
+        # show Fire and the completion index the core predicates as well as leech
+        filter.__signature__ = inspect.signature(Cardlist.filter).replace(parameters=[
+                *inspect.signature(Cardlist.filter).parameters.values(),
+                inspect.Parameter('leech', inspect.Parameter.KEYWORD_ONLY, default=None)])
+
+        # orderings by the review statistics in card_stats
+        _stats_criteria = {'lapses': 'lapses', 'slow': 'mean_seconds', 'struggling': 'ease_trend'}
+
+        def sort(self, criterion=None, *, reverse=False):
+                if criterion not in self._stats_criteria:
+                        new_cardlist = super().sort(criterion, reverse=reverse)
+                        if isinstance(new_cardlist, str):  # the list of criteria
+                                new_cardlist += ' | ' + ' | '.join(self._stats_criteria)
+                        return new_cardlist
+                new_cardlist = self._copy()
+                column = self._stats_criteria[criterion]
+                new_cardlist._ORDER_BY = f' ORDER BY coalesce((SELECT {column} FROM card_stats WHERE card_id = cards.id), 0)'
+                # the most lapses and the slowest first; the steepest fall in ease is already lowest
+                reverse ^= criterion in ('lapses', 'slow')
+                new_cardlist._ORDER_BY += ' DESC' if reverse else ' ASC'
+                return new_cardlist
 
         def find(self, pattern):
                 """ return the first card containing a search pattern """
                 try:
-                        return self.findall(pattern).sort('seen')[1]
+                        return self.findall(pattern)[1]
                 except:
                         return f'no cards containing "{pattern}"'
 
@@ -67,19 +204,24 @@ class CLI_Cardlist(Cardlist):
 
         def _make_basic_card(self):
                 """ make a basic question and answer flashcard """
-                card = CLI_Card._new_card(self._cursor)
-                card.edit()
-                return card
+                id = create_card(self._cursor)
+                return CLI_Card(id, self._cursor) if id is not None else None
         basic = _make_basic_card
 
         def _make_verses_card(self):
                 """ make a verses card: for recipes, poetry, oratory, instructions """
-                card = CLI_Card._new_card(self._cursor)
-                card.card_type = 'verses'
-                card.edit()
-                return card
+                id = create_card(self._cursor, 'verses')
+                return CLI_Card(id, self._cursor) if id is not None else None
         verses = _make_verses_card
 
+        def add(self, tags=None, verses=False, batch=entry_batch):
+                """ make cards one after another until an empty question (tags apply to all of them) """
+                if isinstance(tags, (list, tuple)):
+                        tags = ' '.join(map(str, tags))
+                count = add_cards(self._cursor, 'verses' if verses else 'basic',
+                                  tags=None if tags is None else str(tags), batch=batch)
+                return f'{count} cards added'
+
         def delete(self):
                 l = len(self)
                 print(f'[bold]delete {l} cards? y/n')
@@ -109,6 +251,7 @@ class CLI_Cardlist(Cardlist):
                 purge_count = deleted_cards._purge() 
                 return f'{purge_count} cards purged'
 
-        def stats(self, interval=7):
-                """ review statistics for the collection """
-                return Statistics(self._cursor, interval=interval).print()
+        def stats(self, interval=7, forecast=26, simulate=False):
+                """ review statistics for the collection, and a forecast of FORECAST intervals
+                (--simulate also counts the reviews that reviewing will cause) """
+                return Statistics(self._cursor, interval=interval, forecast=forecast, simulate=simulate).print()
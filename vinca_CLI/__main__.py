@@ -1,6 +1,10 @@
+import sys
+from vinca_CLI import _profile
+# --profile must be removed before Fire sees it and take effect before any connection is opened
+_profile.from_command_line(sys.argv)
+
 from fire import Fire
 from vinca_CLI import _cli_objects
 Fire(component=_cli_objects, name='vinca')
 
     
-
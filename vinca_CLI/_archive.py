@@ -0,0 +1,96 @@
+""" vinca review archive
+
+Reviews older than a horizon are moved out of the collection into an
+archive file next to it (george.sqlite -> george.archive.sqlite).
+When the archive exists it is attached on first use, and the temporary
+view all_reviews shows the reviews of both files as one table.
+
+A card's schedule only depends on its last review and its last 'again',
+so those two reviews of every card always stay in the collection:
+scheduling gives the same due dates with or without the archive.
+Unsynced reviews also stay until they have been pushed. """
+
+import weakref
+from pathlib import Path
+
+from vinca_CLI._config import archive_after_days
+from vinca_CLI._lib.julianday import today
+
+# cursors for which we have already looked for an archive
+_sources = weakref.WeakKeyDictionary()
+
+
+def _main_file(cursor):
+        return next(file for seq, name, file in cursor.execute('PRAGMA database_list') if name == 'main')
+
+
+def archive_file(cursor):
+        return Path(_main_file(cursor)).with_suffix('.archive.sqlite')
+
+
+def _attach(cursor):
+        attached = [name for seq, name, file in cursor.execute('PRAGMA database_list')]
+        if 'archive' not in attached:
+                cursor.execute('ATTACH DATABASE ? AS archive', (str(archive_file(cursor)),))
+        # a temporary view may refer to tables in attached databases
+        cursor.execute('CREATE TEMP VIEW IF NOT EXISTS all_reviews AS '
+                       'SELECT * FROM main.reviews UNION ALL SELECT * FROM archive.reviews')
+
+
+def reviews_source(cursor):
+        """ the relation holding every review: all_reviews if there is an archive, else reviews """
+        if cursor not in _sources:
+                _sources[cursor] = 'reviews'
+                if _main_file(cursor) and archive_file(cursor).exists():
+                        _attach(cursor)
+                        _sources[cursor] = 'all_reviews'
+        return _sources[cursor]
+
+
+class Archive:
+        """ move old reviews out of the collection: `vinca archive move` """
+
+        def __init__(self, cursor):
+                self.cursor = cursor
+
+        def _create(self):
+                _attach(self.cursor)
+                # the archived table is declared exactly like the live one
+                schema = self.cursor.execute("SELECT sql FROM main.sqlite_master WHERE name = 'reviews'").fetchone()[0]
+                schema = schema.replace('CREATE TABLE reviews', 'CREATE TABLE IF NOT EXISTS archive.reviews', 1)
+                self.cursor.execute(schema)
+                self.cursor.execute('CREATE INDEX IF NOT EXISTS archive.archived_card_ids ON reviews (card_id)')
+                _sources[self.cursor] = 'all_reviews'
+
+        def move(self, days=archive_after_days):
+                """ move reviews older than DAYS into the archive file """
+                if not _main_file(self.cursor):
+                        return 'an in-memory collection cannot be archived'
+                self._create()
+                with self.cursor.connection:
+                        # a move that failed may have left its table behind
+                        self.cursor.execute('DROP TABLE IF EXISTS temp.archivable')
+                        self.cursor.execute('''CREATE TEMP TABLE archivable AS
+                                SELECT r.rowid AS rid, r.card_id FROM main.reviews r
+                                WHERE r.date < ? AND r.server_timestamp IS NOT NULL
+                                AND r.date < (SELECT max(date) FROM main.reviews l WHERE l.card_id = r.card_id)
+                                AND (r.grade != 'again' OR r.date < (SELECT max(date) FROM main.reviews a
+                                                                     WHERE a.card_id = r.card_id AND a.grade = 'again'))''',
+                                            (today() - days,))
+                        self.cursor.execute('INSERT INTO archive.reviews SELECT * FROM main.reviews '
+                                            'WHERE rowid IN (SELECT rid FROM temp.archivable)')
+                        self.cursor.execute('DELETE FROM main.reviews WHERE rowid IN (SELECT rid FROM temp.archivable)')
+                        moved = self.cursor.rowcount
+                        # card_state is unchanged: it counts the seconds of archived reviews, and the
+                        # newest review of every card stays
+                        self.cursor.execute('DROP TABLE temp.archivable')
+                return f'{moved} reviews archived to {archive_file(self.cursor)}'
+
+        def status(self):
+                """ how many reviews are live and how many archived """
+                live = self.cursor.execute('SELECT count(*) FROM main.reviews').fetchone()[0]
+                if reviews_source(self.cursor) == 'reviews':
+                        return {'live reviews': live, 'archived reviews': 0}
+                archived = self.cursor.execute('SELECT count(*) FROM archive.reviews').fetchone()[0]
+                return {'live reviews': live, 'archived reviews': archived,
+                        'archive': str(archive_file(self.cursor))}
@@ -0,0 +1,133 @@
+""" vinca backups: snapshots of a collection which may be in use
+
+Copying the collection file while a review is being written can give a torn
+copy. `vinca backup` uses SQLite's online backup API instead: it copies PAGES
+pages at a time, releasing its read lock between steps, so a review session
+running at the same time is never blocked for long. If another process writes
+during the backup SQLite starts the copy again, so it is always consistent.
+
+Each snapshot is checked with `PRAGMA integrity_check`, gzip compressed when
+backup_compress is set and kept beside the collection (or in backup_path):
+george-20261019-143000.sqlite.gz. The review archive, if there is one, is
+saved with the same stamp. Only the newest backup_keep snapshots are kept.
+A snapshot is an ordinary collection once decompressed. """
+
+import datetime
+import gzip
+import shutil
+import sqlite3
+import sys
+from pathlib import Path
+
+from vinca_CLI._config import backup_path, backup_keep, backup_compress
+from vinca_CLI._archive import reviews_source, _main_file
+from vinca_CLI._space import human_size
+
+PAGES_PER_STEP = 1024
+PAUSE = 0.005  # seconds between steps, to let other connections write
+STAMP = '%Y%m%d-%H%M%S'
+SUFFIXES = ('sqlite', 'sqlite.gz', 'archive.sqlite', 'archive.sqlite.gz')
+
+
+def _progress(status, remaining, total):
+        done = total - remaining
+        sys.stderr.write(f'\r{done} of {total} pages copied ({100 * done // max(total, 1)}%)')
+        sys.stderr.flush()
+
+
+def copy(connection, destination, schema='main', pages=PAGES_PER_STEP, progress=None):
+        """ copy one database of a connection into a new file and check the copy """
+        partial = destination.with_name(destination.name + '.partial')
+        partial.unlink(missing_ok=True)
+        target = sqlite3.connect(partial)
+        try:
+                try:
+                        connection.backup(target, pages=pages, progress=progress, name=schema, sleep=PAUSE)
+                        check = target.execute('PRAGMA integrity_check').fetchone()[0]
+                finally:
+                        target.close()
+                if check != 'ok':
+                        raise sqlite3.DatabaseError(f'backup of {schema} failed its integrity check: {check}')
+        except BaseException:  # an interrupted or failed copy leaves no partial file behind
+                partial.unlink(missing_ok=True)
+                raise
+        partial.rename(destination)
+        return destination
+
+
+def gzip_file(path):
+        zipped = path.with_name(path.name + '.gz')
+        with open(path, 'rb') as source, gzip.open(zipped, 'wb', compresslevel=6) as target:
+                shutil.copyfileobj(source, target, 1 << 20)
+        path.unlink()
+        return zipped
+
+
+class Backups:
+        """ snapshots of the collection: `vinca backup` """
+
+        def __init__(self, cursor):
+                self.cursor = cursor
+
+        @property
+        def collection(self):
+                return Path(_main_file(self.cursor))
+
+        @property
+        def directory(self):
+                if backup_path:
+                        return Path(backup_path).expanduser()
+                return self.collection.with_name(self.collection.stem + '-backups')
+
+        def _snapshots(self):
+                """ snapshot files grouped by stamp, newest first """
+                # backup_path may be shared: george-work.sqlite or notes.sqlite.gz are not our snapshots
+                stems = {}
+                for path in self.directory.glob(f'{self.collection.stem}-*.sqlite*'):
+                        stamp, _, suffix = path.name[len(self.collection.stem) + 1:].partition('.')
+                        if suffix not in SUFFIXES:
+                                continue
+                        try:
+                                datetime.datetime.strptime(stamp, STAMP)
+                        except ValueError:
+                                continue
+                        stems.setdefault(stamp, []).append(path)
+                return sorted(stems.items(), reverse=True)
+
+        def make(self, pages=PAGES_PER_STEP, compress=None, keep=None, quiet=False):
+                """ save a snapshot of the collection, PAGES pages at a time """
+                compress = backup_compress if compress is None else compress
+                keep = backup_keep if keep is None else keep
+                self.directory.mkdir(parents=True, exist_ok=True)
+                stamp = datetime.datetime.now().strftime(STAMP)
+                # uncommitted changes of this connection would not be part of the copy
+                self.cursor.connection.commit()
+                schemas = {'main': self.directory / f'{self.collection.stem}-{stamp}.sqlite'}
+                if reviews_source(self.cursor) == 'all_reviews':
+                        schemas['archive'] = self.directory / f'{self.collection.stem}-{stamp}.archive.sqlite'
+                saved = []
+                for schema, destination in schemas.items():
+                        path = copy(self.cursor.connection, destination, schema, pages=pages,
+                                    progress=None if quiet else _progress)
+                        if not quiet:
+                                sys.stderr.write('\n')
+                        saved.append(gzip_file(path) if compress else path)
+                removed = self.rotate(keep)
+                size = sum(path.stat().st_size for path in saved)
+                return f'{saved[0]} saved ({human_size(size)})' + (f', {removed} old snapshots removed' if removed else '')
+
+        def rotate(self, keep=None):
+                """ delete all but the newest KEEP snapshots """
+                keep = backup_keep if keep is None else keep
+                old = self._snapshots()[max(int(keep), 1):]
+                for stamp, paths in old:
+                        for path in paths:
+                                path.unlink()
+                return len(old)
+
+        def list(self):
+                """ the snapshots that are kept, newest first """
+                if not self._snapshots():
+                        return f'no backups in {self.directory}'
+                return {stamp: human_size(sum(path.stat().st_size for path in paths))
+                        for stamp, paths in self._snapshots()}
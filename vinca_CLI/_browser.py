@@ -1,6 +1,9 @@
 from vinca_CLI._lib import ansi
 from vinca_CLI._lib.terminal import LineWrapOff, AlternateScreen
-from vinca_CLI._lib.readkey import readkey, keys
+from vinca_CLI._lib.readkey import readkey, keys, raw_terminal
+from vinca_CLI import _profile
+from vinca_CLI import _bulk
+from vinca_CLI._entry import prompts
 
 FRAME_WIDTH = 6
 
@@ -16,6 +19,8 @@ class Browser:
         self.frame = 0
         self.make_basic_card = make_basic_card
         self.make_verses_card = make_verses_card
+        self.marked = set()  # ids of the cards that bulk actions apply to
+        self.anchor = None  # where the last mark was made, for marking a range
 
     def __len__(self):
         return len(self.cardlist)
@@ -30,7 +35,8 @@ class Browser:
 
     @property
     def status_bar(self):
-        bar_text = ansi.codes['light'] + f'{self.sel + 1} of {len(self)}.' + \
+        marked = f'  {len(self.marked)} marked.' if self.marked else ''
+        bar_text = ansi.codes['light'] + f'{self.sel + 1} of {len(self)}.' + marked + \
                    '  ? for help\n' + ansi.codes['reset']
         return bar_text if len(self) > FRAME_WIDTH else ''
 
@@ -46,7 +52,7 @@ class Browser:
                     ansi.red()
                 if i == self.sel:
                     ansi.highlight()
-                print(card)
+                print('● ' if card.id in self.marked else '', card, sep='')
                 ansi.reset()
 
     def clear_browser(self):
@@ -59,8 +65,9 @@ class Browser:
         exit()
 
     def redraw_browser(self):
-        self.clear_browser()
-        self.draw_browser()
+        with _profile.timer('browser redraw'):
+            self.clear_browser()
+            self.draw_browser()
 
     def move(self, key):
         if key in ('j', keys.DOWN):
@@ -82,6 +89,33 @@ class Browser:
         # scroll up if we are off the screen
         self.frame -= (self.frame - 1 == self.sel)
 
+    def toggle_mark(self):
+        id = self.selected_card.id
+        self.marked.symmetric_difference_update({id})
+        self.anchor = self.sel
+        self.move_down()
+
+    def mark_range(self):
+        # mark every card between the last mark and the selection
+        start, stop = sorted((self.sel, self.sel if self.anchor is None else self.anchor))
+        self.marked.update(self.cardlist.ids[start:stop + 1])
+
+    def bulk_action(self, key):
+        """ apply a hotkey to every marked card in one transaction """
+        cursor = self.cardlist._cursor
+        selection = _bulk.ids_sql(self.marked)
+        if key == 'd':
+            _bulk.toggle_delete(cursor, selection)
+        if key == '+':
+            _bulk.postpone(cursor, selection)
+        if key == 't':
+            with AlternateScreen():
+                words = prompts(cursor).tags.prompt(
+                    f'tags for {len(self.marked)} cards (tag adds, -tag removes): ').split()
+            _bulk.retag(cursor, selection,
+                        add=[w.lstrip('+') for w in words if not w.startswith('-')],
+                        remove=[w[1:] for w in words if w.startswith('-')])
+
     def print_help(self):
         self.clear_browser()
         ansi.show_cursor()
@@ -91,6 +125,11 @@ class Browser:
               'R      review                  \n'
               'E      edit                    \n'
               'T      edit tags               \n'
+              'M      mark / unmark a card    \n'
+              'X      mark up to the last mark\n'
+              'U      unmark all              \n'
+              'D T +  delete, tag, postpone   \n'
+              '       (all marked cards)      \n'
               'B      create basic question   \n'
               'V      create verses card      \n'
               'Q      quit                    \n'
@@ -105,6 +144,12 @@ class Browser:
         if not self.cardlist:
             print('no cards')
             return
+        # hold the terminal in raw mode for the whole session so that
+        # held-down or quickly typed keys are not lost between reads
+        with raw_terminal():
+            self._browse()
+
+    def _browse(self):
         self.draw_browser()
 
         while True:
@@ -138,7 +183,16 @@ class Browser:
             if k in self.move_keys:
                 self.move(k)
 
-            if command := self.selected_card._hotkeys.get(k):
+            if k == 'm':
+                self.toggle_mark()
+            if k == 'x':
+                self.mark_range()
+            if k == 'u':
+                self.marked.clear()
+
+            if self.marked and k in ('d', 't', '+'):
+                self.bulk_action(k)
+            elif command := self.selected_card._hotkeys.get(k):
                 with AlternateScreen():
                     command()
 
@@ -146,7 +200,8 @@ class Browser:
                 with AlternateScreen():
                     new_card = self.make_basic_card() if k == 'b' \
                         else self.make_verses_card() if k == 'v' else None
+                if new_card is not None:  # nothing is saved if the question was left empty
                     self.cardlist.insert(self.sel, new_card)
-                # if this makes us draw a status bar we go down an extra line
-                if len(self) == FRAME_WIDTH + 1:
-                    ansi.down_line()
+                    # if this makes us draw a status bar we go down an extra line
+                    if len(self) == FRAME_WIDTH + 1:
+                        ansi.down_line()
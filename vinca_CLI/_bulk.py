@@ -0,0 +1,56 @@
+""" vinca bulk edits: change many cards with one statement
+
+Each function logs one edit per selected card with a single INSERT ... SELECT
+inside one transaction, so changing 300 cards costs one commit, not 300.
+retag works out the new tags in Python, where tags are whole words, and
+writes them with one executemany in the same way.
+The selection is SQL returning card ids, as in _scheduling;
+`ids_sql` turns a list of ids into such a selection. """
+
+from vinca_CLI._lib.julianday import today
+from vinca_CLI._card_state import source
+
+
+def ids_sql(ids):
+        return ','.join(str(int(id)) for id in ids) or 'NULL'
+
+
+def _log_edits(cursor, field, value_sql, card_ids_sql, condition='1', parameters=()):
+        with cursor.connection:
+                cursor.execute(f'INSERT INTO edits (card_id, {field}) SELECT id, {value_sql} FROM {source(cursor)} '
+                               f'WHERE id IN ({card_ids_sql}) AND ({condition})', parameters)
+                return cursor.rowcount
+
+
+def retag(cursor, card_ids_sql, add=(), remove=()):
+        """ add and remove tags; only cards whose tags change get an edit """
+        # tags are space separated words: split them rather than match them with LIKE,
+        # where _ and % are wildcards; each tag is then kept once, in its first place
+        rows = cursor.execute(f"SELECT id, coalesce(tags, '') FROM {source(cursor)} "
+                              f"WHERE id IN ({card_ids_sql})").fetchall()
+        edits = []
+        for id, tags in rows:
+                new_tags = ' '.join(dict.fromkeys(tag for tag in tags.split() + list(add) if tag not in remove))
+                if new_tags != tags:
+                        edits.append((id, new_tags))
+        with cursor.connection:
+                cursor.executemany('INSERT INTO edits (card_id, tags) VALUES (?, ?)', edits)
+        return len(edits)
+
+
+def toggle_delete(cursor, card_ids_sql):
+        """ delete the cards, or restore them if they are all deleted already """
+        deleted, total = cursor.execute(f"SELECT total(visibility = 'deleted'), count(*) FROM {source(cursor)} "
+                                        f"WHERE id IN ({card_ids_sql})").fetchone()
+        return set_visibility(cursor, card_ids_sql, 'visible' if deleted == total else 'deleted')
+
+
+def set_visibility(cursor, card_ids_sql, visibility):
+        """ delete ('deleted') or restore ('visible') cards; purged cards stay purged """
+        return _log_edits(cursor, 'visibility', ':visibility', card_ids_sql,
+                          "visibility NOT IN (:visibility, 'purged')", {'visibility': visibility})
+
+
+def postpone(cursor, card_ids_sql, n=1):
+        """ make the cards due n days after today, as Card.postpone does """
+        return _log_edits(cursor, 'due_date', ':due', card_ids_sql, parameters={'due': today() + n})
@@ -0,0 +1,162 @@
+""" vinca card state module
+
+The true state of a card is the result of replaying its edits and reviews.
+The cards view recomputes that for every read. card_state is a table
+holding the same columns, kept exact by triggers on the edits and reviews
+tables, so that reading a card is a single lookup by primary key.
+
+An edit which arrives in date order (the usual case) is applied to its row
+directly. An edit which arrives out of order (for instance through sync)
+makes the trigger recompute that card's row from the cards view.
+
+The cards view only sums the seconds of the reviews in the collection.
+card_state also counts those moved to the archive (vinca archive move):
+rows computed here add them, and the trigger keeps a card's review fields
+when it recomputes the card after an edit. """
+
+import weakref
+
+from vinca_CLI import _archive
+
+COLUMNS = ('id', 'front_text', 'back_text', 'tags', 'visibility', 'card_type',
+           'front_image_id', 'back_image_id', 'front_audio_id', 'back_audio_id', 'merit',
+           'create_date', 'due_date', 'last_edit_date', 'last_review_date',
+           'edit_seconds', 'review_seconds', 'total_seconds')
+# edits leave a field NULL when they do not change it
+EDITED_COLUMNS = ('front_text', 'back_text', 'tags', 'visibility', 'card_type',
+                  'front_image_id', 'back_image_id', 'front_audio_id', 'back_audio_id', 'merit', 'due_date')
+
+_columns = ', '.join(COLUMNS)
+# an edit does not change the reviews: their seconds, archived ones included, are kept from the old row
+_review_seconds = 'coalesce(old.review_seconds, cards.review_seconds)'
+_recomputed = ', '.join({'review_seconds': _review_seconds,
+                         'total_seconds': f'cards.edit_seconds + {_review_seconds}'}.get(c, f'cards.{c}')
+                        for c in COLUMNS)
+_refresh = (f'INSERT OR REPLACE INTO card_state ({_columns}) SELECT {_recomputed} '
+            'FROM cards LEFT JOIN card_state AS old ON old.id = cards.id '
+            'WHERE cards.id = new.card_id AND coalesce(new.date < old.last_edit_date, 1);')
+_apply_edit = ', '.join(f'{c} = coalesce(new.{c}, {c})' for c in EDITED_COLUMNS)
+
+EDIT_TRIGGER = f'''CREATE TRIGGER card_state_edit AFTER INSERT ON edits
+BEGIN
+        -- an edit in date order: apply the fields it sets
+        UPDATE card_state SET {_apply_edit},
+                last_edit_date = new.date,
+                edit_seconds = coalesce(edit_seconds, 0) + coalesce(new.seconds, 0),
+                total_seconds = coalesce(total_seconds, 0) + coalesce(new.seconds, 0)
+        WHERE id = new.card_id AND last_edit_date <= new.date;
+        -- a new card, or an edit older than the newest one: recompute the card
+        {_refresh}
+END'''
+
+SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS card_state (
+        id INTEGER PRIMARY KEY,
+        front_text TEXT, back_text TEXT, tags TEXT, visibility TEXT, card_type TEXT,
+        front_image_id INTEGER, back_image_id INTEGER, front_audio_id INTEGER, back_audio_id INTEGER,
+        merit INTEGER,
+        create_date REAL, due_date REAL, last_edit_date REAL, last_review_date REAL,
+        edit_seconds INTEGER, review_seconds INTEGER, total_seconds INTEGER);
+-- the review queue only ever looks at visible cards
+CREATE INDEX IF NOT EXISTS card_state_due ON card_state (due_date) WHERE visibility = 'visible';
+CREATE INDEX IF NOT EXISTS edits_card_date ON edits (card_id, date);
+
+{EDIT_TRIGGER.replace('CREATE TRIGGER', 'CREATE TRIGGER IF NOT EXISTS', 1)};
+
+CREATE TRIGGER IF NOT EXISTS card_state_review AFTER INSERT ON reviews
+BEGIN
+        UPDATE card_state SET
+                last_review_date = max(coalesce(last_review_date, new.date), new.date),
+                review_seconds = coalesce(review_seconds, 0) + coalesce(new.seconds, 0),
+                total_seconds = coalesce(total_seconds, 0) + coalesce(new.seconds, 0)
+        WHERE id = new.card_id;
+END;
+'''
+
+# cursors whose database has a card_state table
+_installed = weakref.WeakKeyDictionary()
+
+
+def source(cursor):
+        """ the relation to read card fields from: card_state if it exists, else the cards view """
+        if cursor not in _installed:
+                found = cursor.execute("SELECT count(*) FROM sqlite_master WHERE name = 'card_state'").fetchone()[0]
+                _installed[cursor] = bool(found)
+        return 'card_state' if _installed[cursor] else 'cards'
+
+
+def state_sql(cursor, where=''):
+        """ the card_state rows computed from the cards view and the archive """
+        if _archive.reviews_source(cursor) == 'reviews':
+                return f'SELECT {_columns} FROM cards {where}'
+        archived = 'coalesce(archived.seconds, 0)'
+        columns = ', '.join(f'{c} + {archived}' if c in ('review_seconds', 'total_seconds') else c for c in COLUMNS)
+        return (f'SELECT {columns} FROM cards LEFT JOIN (SELECT card_id, sum(seconds) AS seconds '
+                f'FROM archive.reviews GROUP BY card_id) AS archived ON archived.card_id = cards.id {where}')
+
+
+def refresh(cursor, card_ids_sql):
+        """ recompute the state of some cards, e.g. after log rows were deleted """
+        if source(cursor) == 'card_state':
+                cursor.execute(f'INSERT OR REPLACE INTO card_state ({_columns}) '
+                               f'{state_sql(cursor, f"WHERE id IN ({card_ids_sql})")}')
+
+
+class CardState:
+        """ maintenance of the card_state table: `vinca state verify` """
+
+        def __init__(self, cursor):
+                self.cursor = cursor
+
+        def install(self):
+                """ create the table and its triggers if they do not exist yet """
+                if source(self.cursor) == 'card_state':
+                        self._upgrade()
+                        return
+                with self.cursor.connection:
+                        self.cursor.executescript(SCHEMA)
+                        self._rebuild()
+                _installed[self.cursor] = True
+
+        def _upgrade(self):
+                # an edit trigger from an older version is replaced and the rows it kept are recomputed
+                row = self.cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' "
+                                          "AND name = 'card_state_edit'").fetchone()
+                if row and row[0] == EDIT_TRIGGER:
+                        return
+                with self.cursor.connection:
+                        self.cursor.execute('BEGIN')  # DROP TRIGGER would otherwise be committed on its own
+                        self.cursor.execute('DROP TRIGGER IF EXISTS card_state_edit')
+                        self.cursor.execute(EDIT_TRIGGER)
+                        self._rebuild()
+
+        def _rebuild(self):
+                self.cursor.execute('DELETE FROM card_state')
+                self.cursor.execute(f'INSERT INTO card_state ({_columns}) {state_sql(self.cursor)}')
+                return self.cursor.rowcount
+
+        def rebuild(self):
+                """ recompute every card's state from the edit and review logs """
+                self.install()
+                with self.cursor.connection:
+                        count = self._rebuild()
+                return f'{count} cards rebuilt'
+
+        def _differences(self):
+                # rows which are in one relation but not identical in the other
+                state = state_sql(self.cursor)
+                return self.cursor.execute(f'SELECT id FROM ({state} EXCEPT '
+                                           f'SELECT {_columns} FROM card_state) UNION '
+                                           f'SELECT id FROM (SELECT {_columns} FROM card_state EXCEPT '
+                                           f'{state})').fetchall()
+
+        def verify(self, repair=False):
+                """ check that card_state matches the logs (--repair fixes it) """
+                self.install()
+                ids = [row[0] for row in self._differences()]
+                if not ids:
+                        return 'card state is consistent'
+                if repair:
+                        self.rebuild()
+                        return f'{len(ids)} inconsistent cards repaired'
+                return f'{len(ids)} inconsistent cards; run `vinca state verify --repair`'
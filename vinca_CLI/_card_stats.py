@@ -0,0 +1,154 @@
+""" vinca card statistics: how each card has been going
+
+card_stats holds per card aggregates of its reviews:
+✠ reviews, lapses (grades of 'again'), seconds and mean seconds per review
+✠ last_grades, the initials of its last RECENT grades (oldest first): 'ggahg'
+✠ ease_trend, the mean score of those recent grades minus its overall mean
+  score (again 0, hard 1, good 2, easy 3); negative means getting harder
+A card with at least leech_lapses lapses is a leech: `vinca filter --leech`.
+
+The table is built with window functions over all reviews (archived ones
+included) and then kept up to date by a trigger which adds each new review
+to its card's row. A review can arrive after newer ones of its card (from a
+sync, a merge or a restored archive): its grade is then put among the recent
+grades in date order rather than after them. """
+
+import weakref
+
+from vinca_CLI._archive import reviews_source
+from vinca_CLI._config import leech_lapses
+
+RECENT = 8
+COLUMNS = ('card_id', 'reviews', 'lapses', 'seconds', 'mean_seconds', 'last_grades', 'score_total', 'ease_trend')
+_score = "CASE {0} WHEN 'again' THEN 0 WHEN 'hard' THEN 1 WHEN 'good' THEN 2 ELSE 3 END"
+# the mean score of a string of grade initials, counting each letter
+_recent_score = ("((length(last_grades) - length(replace(last_grades, 'h', ''))) + "
+                 "2 * (length(last_grades) - length(replace(last_grades, 'g', ''))) + "
+                 "3 * (length(last_grades) - length(replace(last_grades, 'e', '')))) * 1.0 / length(last_grades)")
+
+# the reviews of the card newer than the one being added, at most all its recent grades
+_later = ("min(length(last_grades), (SELECT count(*) FROM reviews "
+          "WHERE card_id = new.card_id AND date > new.date))")
+
+TRIGGER = f'''CREATE TRIGGER card_stats_review AFTER INSERT ON reviews
+BEGIN
+        INSERT OR IGNORE INTO card_stats VALUES (new.card_id, 0, 0, 0, 0, '', 0, 0);
+        UPDATE card_stats SET
+                reviews = reviews + 1,
+                lapses = lapses + (new.grade = 'again'),
+                seconds = seconds + coalesce(new.seconds, 0),
+                last_grades = substr(substr(last_grades, 1, length(last_grades) - {_later}) ||
+                                     substr(new.grade, 1, 1) ||
+                                     substr(last_grades, length(last_grades) - {_later} + 1), -{RECENT}),
+                score_total = score_total + {_score.format('new.grade')}
+        WHERE card_id = new.card_id;
+        UPDATE card_stats SET
+                mean_seconds = seconds * 1.0 / reviews,
+                ease_trend = {_recent_score} - score_total * 1.0 / reviews
+        WHERE card_id = new.card_id;
+END'''
+
+SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS card_stats (
+        card_id INTEGER PRIMARY KEY,
+        reviews INTEGER, lapses INTEGER, seconds INTEGER, mean_seconds REAL,
+        last_grades TEXT, score_total INTEGER, ease_trend REAL);
+CREATE INDEX IF NOT EXISTS card_stats_lapses ON card_stats (lapses);
+{TRIGGER.replace('CREATE TRIGGER', 'CREATE TRIGGER IF NOT EXISTS', 1)};
+'''
+
+# cursors whose database has a card_stats table
+_installed = weakref.WeakKeyDictionary()
+
+
+def installed(cursor):
+        if cursor not in _installed:
+                found = cursor.execute("SELECT count(*) FROM sqlite_master WHERE name = 'card_stats'").fetchone()[0]
+                _installed[cursor] = bool(found)
+        return _installed[cursor]
+
+
+def card_row(cursor, card_id):
+        """ the statistics of one card as a dict, or None if it has no reviews """
+        if not installed(cursor):
+                return None
+        row = cursor.execute('SELECT * FROM card_stats WHERE card_id = ?', (card_id,)).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+
+def leeches(cursor, card_ids):
+        """ the ids among card_ids of leech cards, looked up with one query """
+        if not installed(cursor) or not card_ids:
+                return set()
+        ids = ', '.join(str(int(card_id)) for card_id in card_ids)
+        return {row[0] for row in cursor.execute(
+                f'SELECT card_id FROM card_stats WHERE card_id IN ({ids}) AND lapses >= ?', (leech_lapses,))}
+
+
+def build_sql(reviews, card_ids_sql=None):
+        """ the card_stats rows computed from scratch with window functions """
+        # one window ordering gives both the last RECENT grades and, through lead(), the newest review;
+        # the trend is then computed from those grades as the trigger does
+        where = f'WHERE card_id IN ({card_ids_sql})' if card_ids_sql else ''
+        return f'''
+        SELECT card_id, reviews, lapses, seconds, seconds / reviews, last_grades, score_total,
+               {_recent_score} - score_total * 1.0 / reviews
+        FROM (SELECT card_id, count(*) AS reviews, total(grade = 'again') AS lapses, total(seconds) AS seconds,
+                     max(CASE WHEN newest THEN recent_grades END) AS last_grades, sum(score) AS score_total
+              FROM (SELECT card_id, grade, seconds, score,
+                           lead(card_id) OVER recent IS NULL AS newest,
+                           group_concat(substr(grade, 1, 1), '') OVER recent AS recent_grades
+                    FROM (SELECT card_id, grade, seconds, date, {_score.format('grade')} AS score
+                          FROM {reviews} {where})
+                    WINDOW recent AS (PARTITION BY card_id ORDER BY date ROWS {RECENT - 1} PRECEDING))
+              GROUP BY card_id)'''
+
+
+def refresh(cursor, card_ids_sql):
+        """ recompute the statistics of some cards, e.g. after reviews were replaced """
+        if installed(cursor):
+                CardStats(cursor)._rebuild(card_ids_sql)
+
+
+class CardStats:
+        """ maintenance of the card_stats table: `vinca card_stats rebuild` """
+
+        def __init__(self, cursor):
+                self.cursor = cursor
+
+        def install(self):
+                """ create the table and its trigger if they do not exist yet """
+                if installed(self.cursor):
+                        self._upgrade()
+                        return
+                with self.cursor.connection:
+                        self.cursor.executescript(SCHEMA)
+                        self._rebuild()
+                _installed[self.cursor] = True
+
+        def _upgrade(self):
+                # a trigger from an older version is replaced and the statistics it kept are recomputed
+                row = self.cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' "
+                                          "AND name = 'card_stats_review'").fetchone()
+                if row and row[0] == TRIGGER:
+                        return
+                with self.cursor.connection:
+                        self.cursor.execute('BEGIN')  # DROP TRIGGER would otherwise be committed on its own
+                        self.cursor.execute('DROP TRIGGER IF EXISTS card_stats_review')
+                        self.cursor.execute(TRIGGER)
+                        self._rebuild()
+
+        def _rebuild(self, card_ids_sql=None):
+                if card_ids_sql:
+                        self.cursor.execute(f'DELETE FROM card_stats WHERE card_id IN ({card_ids_sql})')
+                else:
+                        self.cursor.execute('DELETE FROM card_stats')
+                self.cursor.execute(f'INSERT INTO card_stats {build_sql(reviews_source(self.cursor), card_ids_sql)}')
+                return self.cursor.rowcount
+
+        def rebuild(self):
+                """ recompute every card's statistics from its reviews """
+                self.install()
+                with self.cursor.connection:
+                        count = self._rebuild()
+                return f'statistics of {count} cards rebuilt'
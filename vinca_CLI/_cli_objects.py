@@ -1,9 +1,20 @@
 """Spaced Repetition CLI"""
 
+import atexit as _atexit
 import sqlite3 as _sqlite3
 from vinca_CLI._CLI_cardlist import CLI_Cardlist as _CLI_Cardlist
-from vinca_CLI._config import collection_path, __file__ as _config_file
+from vinca_CLI._config import collection_path, collection_paths as _collection_paths, __file__ as _config_file
 from vinca_CLI._sync import Sync as _Sync
+from vinca_CLI._media import Media as _Media
+from vinca_CLI._card_state import CardState as _CardState
+from vinca_CLI._archive import Archive as _Archive
+from vinca_CLI._card_stats import CardStats as _CardStats
+from vinca_CLI._backup import Backups as _Backups
+from vinca_CLI._merge import merge as _merge
+from vinca_CLI._collections import Collections as _Collections
+from vinca_CLI import _completion
+from vinca_CLI._telemetry import Telemetry as _Telemetry
+from vinca_CLI._space import Space as _Space, make_incremental as _make_incremental
 from pathlib import Path as _Path
 
 from rich import print as _print
@@ -14,7 +25,8 @@ _empty_deck_path = _vinca_path / 'empty_deck.db'
 _tutorial_path = _vinca_path / 'tutorial_cards.db'
 
 # create a collection if it does not exist
-if not collection_path.exists():
+_new_collection = not collection_path.exists()
+if _new_collection:
         print(f'no collection found at {collection_path}')
         import shutil
         shutil.copy(_empty_deck_path, collection_path)
@@ -22,10 +34,44 @@ if not collection_path.exists():
 
 # create collection to db
 _cursor = _sqlite3.connect(collection_path).cursor()
+if _new_collection:
+        # free pages can then be given back in small steps: `vinca reclaim`
+        _make_incremental(_cursor)
+
+# card fields are read from a trigger-maintained table: `vinca state verify`
+state = _CardState(_cursor)
+state.install()
+
+# latencies of the interface, shown by `vinca stats`
+_Telemetry(_cursor).install()
+
+# keep the tag list used by shell completion up to date, with the tags added in this run
+_atexit.register(_completion.refresh_tags, _cursor)
+
+# old reviews can be moved to a separate file: `vinca archive move`
+archive = _Archive(_cursor)
+
+# per card review statistics for `vinca filter --leech` and `vinca sort lapses`
+card_stats = _CardStats(_cursor)
+card_stats.install()
 
 # sync interface for the cli
 sync = _Sync(_cursor)
 
+# free space in the collection file: `vinca reclaim`
+space = _Space(_cursor)
+reclaim = space.reclaim
+
+# snapshots taken while the collection may be in use: `vinca backup`
+backups = _Backups(_cursor)
+backup = backups.make
+
+# count, stats and findall across every configured collection: `vinca collections stats`
+collections = _Collections([collection_path, *_collection_paths])
+
+# image maintenance: `vinca media optimize`
+media = _Media(_cursor)
+
 _all_cards = _CLI_Cardlist(_cursor)
 globals()['-a'] = _all_cards
 col = _all_cards
@@ -37,7 +83,7 @@ tutorial = _CLI_Cardlist(_tutorial_cursor)
 
 # import some methods of the collection Cardlist object directly into the module's namespace
 # this is so that ```vinca col review``` can be written as ```vinca review```
-_methods = ('browse', 'count', 'filter', 'find', 'findall', 'review', 'sort', 'purge', 'basic', 'verses', 'stats')
+_methods = ('browse', 'count', 'filter', 'find', 'findall', 'review', 'sort', 'purge', 'basic', 'verses', 'add', 'stats', 'explain', 'reschedule')
 for _method_name in _methods:
     globals()[_method_name] = getattr(col, _method_name)
 
@@ -54,6 +100,11 @@ def edit_config():
     run(['vim', _config_file])
 
 
+def merge(other):
+    """copy the cards and reviews of another collection file into this one"""
+    return _merge(_cursor, other)
+
+
 def help():
     """print basic help"""
     _print('\n',
@@ -64,3 +115,6 @@ def help():
            '[bold green] count                 ', 'simple summary statistics               \n',
            '[bold green] tutorial review       ', 'study a tutorial deck of twenty cards   \n', sep='')
 globals()['-h'] = help
+
+# shell completion: eval "$(vinca completion script bash)"
+completion = _completion.Completion(_cursor, globals())
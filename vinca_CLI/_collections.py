@@ -0,0 +1,123 @@
+""" vinca collections: one question asked of several collection files
+
+collection_paths (config) lists collections kept besides collection_path,
+for instance one per team or subject. `vinca collections count`, `stats`
+and `findall` ask every collection at once and merge the answers.
+
+Each collection is read in a thread of its own through its own read-only
+connection. SQLite releases the GIL while a statement runs, so the files
+are queried in parallel and the answers are merged in the main thread:
+counts and the series behind the stats graphs are added up. """
+
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from vinca_CLI._CLI_cardlist import CLI_Cardlist
+from vinca_CLI._statistics import Statistics
+from vinca_CLI._archive import reviews_source
+from vinca_CLI._lib import ansi
+
+
+def connect_read_only(path):
+        connection = sqlite3.connect(Path(path).expanduser().resolve().as_uri() + '?mode=ro', uri=True)
+        # the archive is attached first: query_only also forbids the temporary view over it
+        reviews_source(connection.cursor())
+        connection.execute('PRAGMA query_only = ON')
+        return connection
+
+
+def _visible(cursor):
+        # the cards `vinca count` and the others see in a collection
+        return CLI_Cardlist(cursor).filter(tag='private', invert=True)
+
+
+def combine(summaries):
+        """ the Statistics summary of all the collections together """
+        summaries = list(summaries)
+        add = lambda key: [sum(counts) for counts in zip(*(s[key] for s in summaries))]
+        earliest = lambda dates: min((d for d in dates if d is not None), default=None)
+        reviews, seconds, first, recent, recent_seconds = zip(*(s['review totals'] for s in summaries))
+        cards, first_created, created = zip(*(s['create totals'] for s in summaries))
+        return {'reviews': add('reviews'), 'created': add('created'), 'due': add('due'),
+                'review totals': (sum(reviews), sum(seconds), earliest(first), sum(recent), sum(recent_seconds)),
+                'create totals': (sum(cards), earliest(first_created), sum(created))}
+
+
+class CombinedStatistics(Statistics):
+        """ the stats of several collections, printed from their added up summaries """
+
+        def __init__(self, summaries, interval=7, forecast=26, simulate=False):
+                super().__init__(None, interval=interval, forecast=forecast, simulate=simulate)
+                self.summaries = summaries
+
+        def summary(self):
+                return combine(self.summaries)
+
+        def latency_stats(self):
+                return ''  # latencies belong to the interface, not to a collection
+
+        def free_space(self):
+                return 0
+
+
+class Collections:
+        """ count, stats and findall across all configured collections """
+
+        def __init__(self, paths):
+                self.paths = [Path(path).expanduser() for path in paths]
+
+        def _names(self):
+                stems = [path.stem for path in self.paths]
+                return [path.stem if stems.count(path.stem) == 1 else str(path) for path in self.paths]
+
+        def _map(self, function):
+                """ {collection name: function(cursor)}, each collection read in its own thread """
+                def run(path):
+                        connection = connect_read_only(path)
+                        try:
+                                return function(connection.cursor())
+                        finally:
+                                connection.close()
+                paths = [path for path in self.paths if path.exists()]
+                if not paths:
+                        return {}
+                # one thread per collection: a cold file waits on the disk, not on a processor
+                with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+                        results = list(pool.map(run, paths))
+                names = dict(zip(self.paths, self._names()))
+                return {names[path]: result for path, result in zip(paths, results)}
+
+        def list(self):
+                """ the configured collections """
+                return {name: str(path) if path.exists() else f'{path} (missing)'
+                        for name, path in zip(self._names(), self.paths)}
+
+        def count(self):
+                """ simple summary statistics of every collection and of all of them """
+                counts = self._map(lambda cursor: _visible(cursor).count())
+                numbers = ('total', 'due', 'new')
+                counts['all'] = {key: sum(c[key] for c in counts.values()) for key in numbers}
+                return counts
+
+        def stats(self, interval=7, forecast=26, simulate=False):
+                """ review statistics of all the collections together """
+                summaries = self._map(lambda cursor: Statistics(cursor, interval=interval, forecast=forecast,
+                                                                simulate=simulate).summary())
+                if not summaries:
+                        return 'no collections found'
+                return CombinedStatistics(list(summaries.values()), interval, forecast, simulate).print()
+
+        def findall(self, pattern, limit=6):
+                """ cards containing a search pattern, in every collection """
+                def find(cursor):
+                        cards = _visible(cursor).findall(pattern)
+                        return len(cards), [str(card) for card in cards.explicit_cards_list(LIMIT=limit)]
+                lines = []
+                for name, (count, cards) in self._map(find).items():
+                        if count:
+                                shown = f'{limit} of {count}' if count > limit else f'{count}'
+                                lines += [f'{name}: {shown}'] + cards
+                if not lines:
+                        return f'no cards containing "{pattern}"'
+                return ansi.codes['line_wrap_off'] + '\n'.join(lines) + ansi.codes['line_wrap_on']
@@ -0,0 +1,130 @@
+""" vinca edit-log compaction
+
+Each edit only sets the fields it changes and leaves the rest NULL.
+An edit is superseded once every field it sets has been set again by a
+later edit of the same card: it can no longer affect the card's state,
+whichever device reads the log. Compaction deletes superseded edits.
+
+✠ unsynced edits are compacted before they are pushed,
+  so that typing and retyping a card uploads only the last version
+✠ synced edits are compacted once the server has acknowledged them,
+  i.e. once our sync checkpoint has passed their server_timestamp, and a
+  later synced edit supersedes them
+
+Afterwards a card keeps at most one edit per field (plus its first edit),
+however often it has been changed. An edit which sets no field at all is
+never superseded.
+
+The seconds spent on deleted edits are kept so that time statistics are
+unchanged, without adding rows to the log:
+✠ the seconds of unsynced edits are added to an unsynced edit of the card
+  which is kept, or else to a new edit which sets no field; either is
+  pushed in place of the deleted edits
+✠ the seconds of synced edits are added to the newest synced edit of the
+  card. It is never pushed again: the server and the other devices keep
+  the deleted edits, or fold them in the same way when they compact """
+
+from vinca_CLI import _card_state
+
+CHECKPOINT_SCHEMA = 'CREATE TABLE IF NOT EXISTS sync_checkpoint (server_timestamp INTEGER NOT NULL)'
+# columns of edits which are not fields of the card
+BOOKKEEPING = ('id', 'card_id', 'date', 'seconds', 'server_timestamp')
+SYNCED = 'server_timestamp IS NOT NULL'
+
+
+def checkpoint(cursor):
+        """ the server timestamp up to which we have received every record """
+        cursor.execute(CHECKPOINT_SCHEMA)
+        return cursor.execute('SELECT coalesce(max(server_timestamp), 0) FROM sync_checkpoint').fetchone()[0]
+
+
+def set_checkpoint(cursor, server_timestamp):
+        cursor.execute(CHECKPOINT_SCHEMA)
+        cursor.execute('DELETE FROM sync_checkpoint')
+        cursor.execute('INSERT INTO sync_checkpoint VALUES (?)', (server_timestamp,))
+
+
+def superseded_sql(fields, scope, later_scope='1'):
+        """ SQL selecting the superseded edits within a scope, counting only later
+        edits within later_scope; both scopes are conditions on a row of edits """
+        # one window over each card's edits in order: for every field, how many later edits set it
+        later = ', '.join(f'count(CASE WHEN {later_scope} THEN {f} END) OVER later AS later_{f}' for f in fields)
+        sets_a_field = ' OR '.join(f'{f} IS NOT NULL' for f in fields)
+        overwritten = ' AND '.join(f'({f} IS NULL OR later_{f})' for f in fields)
+        # the first edit of a card records its creation and is always kept
+        return f'''
+        SELECT rid, id, card_id, date, seconds, server_timestamp FROM (
+                SELECT rowid AS rid, id, card_id, date, seconds, server_timestamp, {', '.join(fields)},
+                       ({scope}) AS in_scope, row_number() OVER later AS position, {later}
+                FROM edits WHERE card_id IN (SELECT card_id FROM edits WHERE {scope})
+                WINDOW later AS (PARTITION BY card_id ORDER BY date, rowid ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING))
+        WHERE in_scope AND position > 1 AND ({sets_a_field}) AND {overwritten}'''
+
+
+class Compactor:
+
+        def __init__(self, cursor):
+                self.cursor = cursor
+
+        @property
+        def fields(self):
+                columns = [row[1] for row in self.cursor.execute('PRAGMA table_info(edits)')]
+                return [c for c in columns if c not in BOOKKEEPING]
+
+        def _superseded(self, scope, later_scope='1'):
+                return superseded_sql(self.fields, scope, later_scope)
+
+        def _delete(self, scope, later_scope='1', params=()):
+                """ delete the superseded edits of a scope, keeping them in temp.superseded """
+                # the window sorts each card's edits; the index lets it read them in order
+                self.cursor.execute('CREATE INDEX IF NOT EXISTS edits_card_date ON edits (card_id, date)')
+                self.cursor.execute('DROP TABLE IF EXISTS temp.superseded')
+                self.cursor.execute(f'CREATE TEMP TABLE superseded AS {self._superseded(scope, later_scope)}', params)
+                self.cursor.execute('DELETE FROM edits WHERE rowid IN (SELECT rid FROM temp.superseded)')
+                return self.cursor.rowcount
+
+        def _compact_unsynced(self):
+                count = self._delete('server_timestamp IS NULL')
+                # keep the time spent editing: the seconds go to a kept unsynced edit of the card ...
+                self.cursor.execute('''CREATE TEMP TABLE unsynced_seconds AS
+                        SELECT card_id, max(date) AS date, sum(seconds) AS seconds,
+                               (SELECT rowid FROM edits e WHERE e.card_id = s.card_id AND e.server_timestamp IS NULL
+                                ORDER BY date, rowid LIMIT 1) AS kept
+                        FROM temp.superseded s WHERE seconds GROUP BY card_id''')
+                self.cursor.execute('''UPDATE edits SET seconds = coalesce(seconds, 0) +
+                                (SELECT seconds FROM temp.unsynced_seconds u WHERE u.kept = edits.rowid)
+                        WHERE rowid IN (SELECT kept FROM temp.unsynced_seconds)''')
+                # ... or to a new edit
+                self.cursor.execute('''INSERT INTO edits (id, card_id, date, seconds)
+                        SELECT random(), card_id, date, seconds FROM temp.unsynced_seconds WHERE kept IS NULL''')
+                # the trigger counted these seconds on top of those of the deleted edits
+                if self.cursor.rowcount:
+                        _card_state.refresh(self.cursor, 'SELECT card_id FROM temp.unsynced_seconds WHERE kept IS NULL')
+                self.cursor.execute('DROP TABLE temp.unsynced_seconds')
+                self.cursor.execute('DROP TABLE temp.superseded')
+                return count
+
+        def _compact_synced(self):
+                count = self._delete('server_timestamp <= :checkpoint', SYNCED, {'checkpoint': checkpoint(self.cursor)})
+                # the seconds go to the newest synced edit of the card: nothing supersedes it
+                self.cursor.execute(f'''CREATE TEMP TABLE synced_seconds AS
+                        SELECT sum(seconds) AS seconds,
+                               (SELECT rowid FROM edits e WHERE e.card_id = s.card_id AND e.{SYNCED}
+                                ORDER BY date DESC, rowid DESC LIMIT 1) AS kept
+                        FROM temp.superseded s WHERE seconds GROUP BY card_id''')
+                self.cursor.execute('''UPDATE edits SET seconds = coalesce(seconds, 0) +
+                                (SELECT seconds FROM temp.synced_seconds s WHERE s.kept = edits.rowid)
+                        WHERE rowid IN (SELECT kept FROM temp.synced_seconds)''')
+                self.cursor.execute('DROP TABLE temp.synced_seconds')
+                self.cursor.execute('DROP TABLE temp.superseded')
+                return count
+
+        def coalesce_unsynced(self):
+                """ drop unsynced edits which later edits overwrite; returns the number removed """
+                with self.cursor.connection:
+                        return self._compact_unsynced()
+
+        def compact(self):
+                """ drop every superseded edit the server has acknowledged, and unsynced ones """
+                with self.cursor.connection:
+                        return self._compact_unsynced() + self._compact_synced()
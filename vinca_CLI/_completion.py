@@ -0,0 +1,125 @@
+""" vinca shell completion: eval "$(vinca completion script bash)"
+
+Starting vinca to answer a TAB press would open the collection and import
+everything, so the shell scripts read word lists from an index directory
+instead, one word per line:
+✠ commands: the names `vinca` accepts first
+✠ cardlist, card: the methods that can follow a cardlist or a card
+✠ options: the --keyword arguments of those methods
+✠ tags: the tags of the collection, for --tag
+The tag list is compared with the tags of the collection when vinca exits
+and rewritten only if they differ, so the tags of a card added in one run
+complete in the next; reviewing or editing cards leaves the index alone.
+The completion scripts only read files: a TAB press never starts vinca. """
+
+import inspect
+import os
+import shlex
+from pathlib import Path
+
+from vinca_CLI._CLI_card import CLI_Card
+
+INDEX_DIR = Path(os.environ.get('XDG_CACHE_HOME', '~/.cache')).expanduser() / 'vinca' / 'completion'
+SHELLS = ('bash', 'zsh', 'fish')
+
+BASH = r'''
+_vinca() {
+        local dir=@DIR@ cur=${COMP_WORDS[COMP_CWORD]} prev=${COMP_WORDS[COMP_CWORD-1]} words
+        # --tag=x is split at the = by readline
+        if [[ $prev == = ]]; then prev=${COMP_WORDS[COMP_CWORD-2]}; fi
+        if [[ $prev == --tag ]]; then
+                words=$(<"$dir/tags")
+        elif [[ $cur == -* ]]; then
+                words=$(<"$dir/options")
+        elif (( COMP_CWORD == 1 )); then
+                words=$(<"$dir/commands")
+        elif [[ ${COMP_WORDS[1]} =~ ^(1|2|3|find)$ ]]; then
+                words=$(<"$dir/card")
+        else
+                words=$(<"$dir/cardlist")
+        fi
+        COMPREPLY=($(compgen -W "$words" -- "$cur"))
+}
+complete -F _vinca vinca
+'''
+
+ZSH = '''
+autoload -U +X bashcompinit && bashcompinit
+''' + BASH
+
+FISH = r'''
+function __vinca_words
+        cat @DIR@/$argv[1]
+end
+function __vinca_after_card
+        set -l words (commandline -opc)
+        contains -- $words[2] 1 2 3 find
+end
+complete -c vinca -f
+complete -c vinca -n __fish_is_first_arg -a '(__vinca_words commands)'
+complete -c vinca -n 'not __fish_is_first_arg; and __vinca_after_card' -a '(__vinca_words card)'
+complete -c vinca -n 'not __fish_is_first_arg; and not __vinca_after_card' -a '(__vinca_words cardlist)'
+complete -c vinca -l tag -x -a '(__vinca_words tags)'
+'''
+
+
+def _lines(words):
+        return ''.join(f'{word}\n' for word in sorted(set(words)))
+
+
+def _write(name, words):
+        INDEX_DIR.mkdir(parents=True, exist_ok=True)
+        temporary = INDEX_DIR / f'.{name}'
+        temporary.write_text(_lines(words))
+        temporary.replace(INDEX_DIR / name)  # a TAB press never sees half a file
+
+
+def _options(*objects):
+        for obj in objects:
+                for name in dir(obj):
+                        if name.startswith('_') or not callable(method := getattr(obj, name, None)):
+                                continue
+                        try:
+                                parameters = inspect.signature(method).parameters
+                        except (TypeError, ValueError):
+                                continue
+                        yield from (f'--{p}' for p in parameters if p not in ('self', 'cursor', 'args', 'kwargs'))
+
+
+def _tags(cursor):
+        return [row[0] for row in cursor.execute('SELECT tag FROM tags GROUP BY tag') if row[0]]
+
+
+def refresh_tags(cursor):
+        """ rewrite the tag list if the tags of the collection are not those in it """
+        tags, index = _tags(cursor), INDEX_DIR / 'tags'
+        if not index.exists() or index.read_text() != _lines(tags):
+                _write('tags', tags)
+
+
+class Completion:
+        """ shell completion: `vinca completion script bash` """
+
+        def __init__(self, cursor, namespace):
+                self._cursor = cursor
+                self._namespace = namespace
+
+        def refresh(self):
+                """ rewrite the completion index """
+                commands = [name for name, obj in self._namespace.items()
+                            if not name.startswith('_') and not inspect.ismodule(obj) and not isinstance(obj, (str, Path))]
+                cardlist = self._namespace['col']
+                _write('commands', commands)
+                _write('cardlist', (name for name in dir(cardlist) if not name.startswith('_')))
+                _write('card', (name for name in dir(CLI_Card) if not name.startswith('_')))
+                _write('options', _options(cardlist, CLI_Card))
+                refresh_tags(self._cursor)
+                return f'completion index written to {INDEX_DIR}'
+
+        def script(self, shell='bash'):
+                """ print a completion script: eval "$(vinca completion script bash)" """
+                if shell not in SHELLS:
+                        return f'unknown shell {shell}: choose from {", ".join(SHELLS)}'
+                self.refresh()
+                template = {'bash': BASH, 'zsh': ZSH, 'fish': FISH}[shell]
+                return template.replace('@DIR@', shlex.quote(str(INDEX_DIR)))
@@ -1,2 +1,29 @@
 # location of the database file
 collection_path = '~/george.sqlite'
+# how card images are shown: 'x11' opens a window on top of the terminal,
+# 'terminal' draws the image inline (works over ssh), 'auto' picks one
+image_backend = 'auto'
+# images are converted to PNG and shrunk to at most this many pixels on a side
+max_image_size = 1024
+# if set, the original image files are also copied into this directory
+originals_path = None
+# during review a new card is shown after every this many reviews (0: new cards last)
+new_card_interval = 4
+# a card graded 'again' is shown again this many seconds later in the same session
+relearn_delay = 240
+# `vinca archive move` moves reviews older than this many days into an archive file
+archive_after_days = 365
+# how many latency measurements of the interface are kept for `vinca stats` (0: none)
+telemetry_size = 5000
+# a card graded 'again' this many times is a leech: `vinca filter --leech`
+leech_lapses = 8
+# `vinca backup` saves snapshots here (None: a directory beside the collection, george-backups)
+backup_path = None
+# how many snapshots are kept; older ones are deleted after each backup
+backup_keep = 7
+# snapshots are gzip compressed
+backup_compress = True
+# `vinca add` saves the cards it is given this many at a time
+entry_batch = 10
+# more collection files, e.g. one per team or subject: `vinca collections stats` covers them all
+collection_paths = []
@@ -0,0 +1,137 @@
+""" vinca card entry: prompts which stay ready between cards
+
+prompt_toolkit.prompt builds a new application, key bindings and completer
+for every call. The sessions here are built once per collection and reused
+for every field of every card: up and down recall what was typed before in
+the same field, and the tag completer is loaded from the collection once.
+
+A new card is a single edit row carrying all its fields. `vinca add` asks
+for cards in a loop (an empty question ends it) and writes them entry_batch
+at a time, each batch in one transaction; typed cards are written before
+the loop returns, also when it is left with Ctrl-C. """
+
+import random
+import time
+import weakref
+from functools import cached_property
+
+from prompt_toolkit import PromptSession
+from prompt_toolkit.completion import WordCompleter
+from prompt_toolkit.history import InMemoryHistory
+
+from vinca_CLI._config import entry_batch
+from vinca_CLI._lib.readkey import discard_pending
+from vinca_CLI._lib.julianday import now
+
+MAX_SECONDS = 120  # at most this much time is counted for writing or editing a card
+FIELDS = ('card_id', 'date', 'seconds', 'card_type', 'front_text', 'back_text', 'tags')
+
+class Session(PromptSession):
+        """ a prompt session which comes after the keys read ahead for the browser """
+
+        def prompt(self, *args, **kwargs):
+                # those keys were typed before the prompt opened; left in the buffer they
+                # would later be read as hotkeys, and 'd' deletes a card
+                discard_pending()
+                return super().prompt(*args, **kwargs)
+
+
+# cursors whose prompts have been built
+_prompts = weakref.WeakKeyDictionary()
+
+
+def prompts(cursor):
+        if cursor not in _prompts:
+                _prompts[cursor] = Prompts(cursor)
+        return _prompts[cursor]
+
+
+class Prompts:
+        """ one prompt session per field """
+
+        def __init__(self, cursor):
+                self.cursor = cursor
+
+        @staticmethod
+        def _text_session():
+                return Session(multiline=True, vi_mode=True, history=InMemoryHistory(),
+                               bottom_toolbar=lambda: 'press ESC-Enter to confirm')
+
+        @cached_property
+        def question(self):
+                return self._text_session()
+
+        @cached_property
+        def answer(self):
+                return self._text_session()
+
+        @cached_property
+        def verses(self):
+                return self._text_session()
+
+        @cached_property
+        def tag_words(self):
+                return [row[0] for row in self.cursor.execute('SELECT tag FROM tags GROUP BY tag') if row[0]]
+
+        @cached_property
+        def tags(self):
+                return Session(completer=WordCompleter(lambda: self.tag_words), history=InMemoryHistory())
+
+        def ask_tags(self, default=''):
+                tags = self.tags.prompt('tags: ', default=default or '')
+                self.tag_words.extend(tag for tag in tags.split() if tag not in self.tag_words)
+                return tags
+
+
+def insert_cards(cursor, rows):
+        """ write new cards, one edit row each, in one transaction """
+        columns = ', '.join(FIELDS)
+        with cursor.connection:
+                cursor.executemany(f'INSERT INTO edits ({columns}) VALUES ({",".join("?" * len(FIELDS))})', rows)
+
+
+def ask_card(cursor, card_type='basic', tags=None):
+        """ prompt for the fields of a new card; the edit row, or None if the question is left empty """
+        ask = prompts(cursor)
+        start = time.time()
+        if card_type == 'verses':
+                front_text, back_text = ask.verses.prompt('Verses:     '), None
+        else:
+                front_text = ask.question.prompt('Question:   ')
+                back_text = ask.answer.prompt('Answer:     ') if front_text.strip() else None
+        if not front_text.strip():
+                return None
+        seconds = min(MAX_SECONDS, time.time() - start)
+        return (random.getrandbits(63) or 1, now(), seconds, 'verses' if card_type == 'verses' else None,
+                front_text, back_text, tags or None)
+
+
+def create_card(cursor, card_type='basic'):
+        """ prompt for one card and save it; returns its id, or None if nothing was entered """
+        row = ask_card(cursor, card_type)
+        if row is None:
+                return None
+        insert_cards(cursor, [row])
+        return row[0]
+
+
+def add_cards(cursor, card_type='basic', tags=None, batch=entry_batch):
+        """ prompt for cards until an empty question; returns how many were saved """
+        pending, saved = [], 0
+        try:
+                if tags is None:
+                        tags = prompts(cursor).ask_tags()
+                while (row := ask_card(cursor, card_type, tags)) is not None:
+                        pending.append(row)
+                        if len(pending) >= batch:
+                                # taken out first: if the write fails, finally must not write them again
+                                rows, pending = pending, []
+                                insert_cards(cursor, rows)
+                                saved += len(rows)
+        except (KeyboardInterrupt, EOFError):
+                pass  # leaving the loop keeps the cards typed so far
+        finally:
+                if pending:
+                        insert_cards(cursor, pending)
+                        saved += len(pending)
+        return saved
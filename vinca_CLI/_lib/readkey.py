@@ -1,5 +1,13 @@
 # A simple module for reading a keystroke from the user
 # adapted from the getchar function in the click library
+#
+# Bytes are read from the terminal into a buffer and split into whole keys,
+# so that fast typing, key repeat and pasted text are not merged into one
+# unrecognisable string. Hold the terminal in raw mode for a whole session with
+#
+#     with raw_terminal():
+#             ...
+#             readkey()
 
 import os
 from types import SimpleNamespace
@@ -9,33 +17,168 @@ keys = SimpleNamespace( UP = '\x1b[A', DOWN = '\x1b[B', RIGHT = '\x1b[C', LEFT =
                         CTRL_RIGHT = '\x1b[1;5C', CTRL_LEFT = '\x1b[1;5D',
                         ESC = '\x1b', BACK = '\x7f', CTRL_R = '\x12', CTRL_K = '\x0b')
 
+# After an ESC byte we wait this long (in seconds) for the rest of an escape sequence.
+# If nothing arrives the user pressed the escape key itself.
+ESC_TIMEOUT = 0.025
+
+
+def split_key(pending, complete=False):
+        """Split the first key off a string of characters read from the terminal.
+        Returns (key, rest), or (None, pending) if more characters are needed.
+        With complete=True a partial escape sequence is returned as it is.
+
+        >>> split_key('jjk')
+        ('j', 'jk')
+        >>> split_key('\\x1b[1;5Aq')
+        ('\\x1b[1;5A', 'q')
+        >>> split_key('\\x1bOB')  # arrows in application cursor mode
+        ('\\x1b[B', '')
+        >>> split_key('\\x1b')
+        (None, '\\x1b')
+        >>> split_key('\\x1b', complete=True)
+        ('\\x1b', '')
+        >>> split_key('\\x1bj')  # alt-j
+        ('\\x1bj', '')
+        """
+        if not pending:
+                return None, pending
+        if pending[0] != '\x1b':
+                return pending[0], pending[1:]
+        if len(pending) == 1:
+                return ('\x1b', '') if complete else (None, pending)
+        if pending[1] == '[':
+                # Control Sequence Introducer: ESC [ parameters intermediates final
+                # parameters and intermediates lie in 0x20-0x3F, the final byte in 0x40-0x7E
+                for i in range(2, len(pending)):
+                        if '\x40' <= pending[i] <= '\x7e':
+                                return pending[:i + 1], pending[i + 1:]
+                        if not '\x20' <= pending[i] <= '\x3f':
+                                return pending[:i], pending[i:]  # malformed; cut it short
+                return (pending, '') if complete else (None, pending)
+        if pending[1] == 'O':
+                # Single Shift Three: F1-F4, and the arrows in application cursor mode
+                if len(pending) == 2:
+                        return (pending, '') if complete else (None, pending)
+                key = pending[:3]
+                if key[2] in 'ABCD':
+                        key = '\x1b[' + key[2]
+                return key, pending[3:]
+        # ESC followed by an ordinary character is alt+character
+        return pending[:2], pending[2:]
+
+
 if os.name == 'posix':
-    import tty
-    import termios
-    import sys
+    import codecs
     import contextlib
-    @contextlib.contextmanager
-    def raw_terminal():
-            fd = sys.stdin.fileno()
+    import select
+    import sys
+    import termios
 
-            old_settings = termios.tcgetattr(fd) # save state of terminal
+    class KeyReader:
+            """Reads from the terminal into a buffer and hands out one key at a time.
+            Characters left over from one read are kept for the next call."""
 
-            try:
+            def __init__(self):
+                    self.pending = ''
+                    self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                    self.depth = 0  # how many raw_terminal sessions are open
+                    self.old_settings = None
+
+            @property
+            def fd(self):
+                    return sys.stdin.fileno()
+
+            def _fill(self, timeout=None):
+                    """ read whatever the terminal has for us; False if we timed out """
+                    if timeout is not None:
+                            ready, _, _ = select.select([self.fd], [], [], timeout)
+                            if not ready:
+                                    return False
+                    data = os.read(self.fd, 1024)
+                    if not data:
+                            # end of input or a closed terminal: there will never be another key
+                            raise EOFError
+                    self.pending += self.decoder.decode(data)
+                    return True
+
+            def readkey(self):
+                    while True:
+                            key, rest = split_key(self.pending)
+                            if key is not None:
+                                    self.pending = rest
+                                    return key
+                            if self.pending:
+                                    # we are inside an escape sequence; wait briefly for the rest
+                                    try:
+                                            more = self._fill(timeout=ESC_TIMEOUT)
+                                    except EOFError:
+                                            more = False
+                                    if not more:
+                                            key, self.pending = split_key(self.pending, complete=True)
+                                            return key
+                            else:
+                                    self._fill()
+
+            def discard(self):
+                    """ forget the keys read ahead, e.g. before another program reads the terminal """
+                    self.pending = ''
+                    self.decoder.reset()
+
+            def enter(self):
+                    self.depth += 1
+                    if self.depth > 1:
+                            return
+                    fd = self.fd
+                    self.old_settings = termios.tcgetattr(fd) # save state of terminal
                     # the tty has two modes:
                     # 'cooked' waits for the user to press enter
                     # 'raw' passes the typed characters immediately
-                    tty.setraw(fd)
-                    yield fd
-            finally:
+                    # Unlike tty.setraw we keep output processing on, so that
+                    # printing works normally during a session, and we apply the
+                    # change with TCSANOW, so that keys typed ahead are not discarded.
+                    mode = termios.tcgetattr(fd)
+                    mode[0] &= ~(termios.BRKINT | termios.ICRNL | termios.INPCK | termios.ISTRIP | termios.IXON)
+                    mode[2] &= ~(termios.CSIZE | termios.PARENB)
+                    mode[2] |= termios.CS8
+                    mode[3] &= ~(termios.ECHO | termios.ICANON | termios.IEXTEN | termios.ISIG)
+                    mode[6][termios.VMIN] = 1
+                    mode[6][termios.VTIME] = 0
+                    termios.tcsetattr(fd, termios.TCSANOW, mode)
+
+            def exit(self):
+                    self.depth -= 1
+                    if self.depth > 0:
+                            return
                     # restore state of terminal
-                    termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-                    sys.stdout.flush() 
+                    termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_settings)
+                    sys.stdout.flush()
+
+    reader = KeyReader()
+
+    @contextlib.contextmanager
+    def raw_terminal():
+            reader.enter()
+            try:
+                    yield reader.fd
+            finally:
+                    reader.exit()
 
     def readkey():
-            with raw_terminal() as fd:
-                    # a single key can be represented by up to 6 bytes
-                    return os.read(fd, 6).decode()
+            with raw_terminal():
+                    return reader.readkey()
+
+    def discard_pending():
+            reader.discard()
 else: # Windows OS
+    import contextlib
     from msvcrt import getch
+
+    @contextlib.contextmanager
+    def raw_terminal():
+            yield  # the windows console already hands us single keys
+
     def readkey():
             return getch().decode()
+
+    def discard_pending():
+            pass  # keys are read one at a time, so none are held back
@@ -0,0 +1,272 @@
+# Draw images directly inside the terminal so that images work over ssh.
+# Terminals which understand the kitty graphics protocol or sixels
+# get a real picture; every other terminal gets unicode block characters.
+#
+# Rendering an image means decoding, resizing and encoding it, which is
+# slow for large pictures. So finished renders are cached per
+# (image hash, terminal size, protocol) in memory and on disk.
+# The memory cache holds the MEMORY_RENDERS most recently used renders;
+# the disk cache is kept under CACHE_BYTES by deleting the renders
+# which were used least recently.
+
+import base64
+import hashlib
+import os
+import re
+import shutil
+import struct
+import sys
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+
+from vinca_CLI._lib.unicode_bitmaps import Bitmap
+
+try:
+        from PIL import Image
+except ImportError:  # pillow is optional; without it only kitty can draw images
+        Image = None
+
+CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME', '~/.cache')).expanduser() / 'vinca' / 'renders'
+CACHE_BYTES = 64 * 2**20
+MEMORY_RENDERS = 32
+TERMINAL_BACKGROUND = (0, 0, 0)
+MARGIN = 2  # columns left free on either side of the image
+CELL_PIXELS = (10, 20)  # assumed (width, height) of a character cell if the terminal won't say
+
+_cache = OrderedDict()  # the most recently used render last
+
+ESC = '\x1b'
+ST = ESC + '\\'  # string terminator for kitty and sixel escape sequences
+
+
+def x11_available():
+        """ can we pop up an X window on top of the terminal? """
+        return bool(os.environ.get('DISPLAY')) and \
+               not os.environ.get('SSH_CONNECTION') and \
+               bool(shutil.which('xdotool'))
+
+
+def protocol():
+        """ the best way to draw an image in this terminal:
+        'kitty', 'sixel', 'halfblock' (24 bit color), 'quadrant' (monochrome), or None """
+        if forced := os.environ.get('VINCA_IMAGE_PROTOCOL'):
+                return forced
+        term = os.environ.get('TERM', '')
+        program = os.environ.get('TERM_PROGRAM', '')
+        if 'kitty' in term or os.environ.get('KITTY_WINDOW_ID') or program in ('WezTerm', 'ghostty'):
+                return 'kitty'
+        if Image is None:
+                return None
+        if 'sixel' in term or term.startswith(('mlterm', 'foot', 'yaft', 'contour')):
+                return 'sixel'
+        if os.environ.get('COLORTERM') in ('truecolor', '24bit'):
+                return 'halfblock'
+        return 'quadrant'
+
+
+def cell_pixels():
+        """ (width, height) of one character cell in pixels """
+        try:
+                import fcntl
+                import termios
+                packed = fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, b'\0' * 8)
+                rows, cols, xpixels, ypixels = struct.unpack('HHHH', packed)
+                if rows and cols and xpixels and ypixels:
+                        return xpixels // cols, ypixels // rows
+        except Exception:
+                pass
+        return CELL_PIXELS
+
+
+def png_size(data_bytes):
+        """ read (width, height) from the header of a PNG """
+        if data_bytes[:8] != b'\x89PNG\r\n\x1a\n':
+                return None
+        return struct.unpack('>II', data_bytes[16:24])
+
+
+def fit(width, height, max_width, max_height):
+        """ scale (width, height) down to fit inside the box; never scale up """
+        scale = min(1, max_width / width, max_height / height)
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def render(data_bytes, columns=None, lines=None, protocol_name=None):
+        """ escape sequences which draw the image, sized for the terminal """
+        if columns is None or lines is None:
+                columns, lines = shutil.get_terminal_size()
+        protocol_name = protocol_name or protocol()
+        if not protocol_name or not data_bytes:
+                return ''
+        digest = hashlib.sha1(data_bytes).hexdigest()
+        key = (digest, columns, lines, protocol_name)
+        if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
+        cache_file = CACHE_DIR / f'{digest}-{columns}x{lines}-{protocol_name}'
+        try:
+                s = cache_file.read_text(encoding='utf-8')
+                os.utime(cache_file)  # recently used renders are evicted last
+                return _remember(key, s)
+        except OSError:
+                pass
+        # the image may take up the full width and half the height of the terminal
+        max_columns, max_lines = max(1, columns - 2 * MARGIN), max(1, lines // 2)
+        encoders = {'kitty': _kitty, 'sixel': _sixel, 'halfblock': _halfblock, 'quadrant': _quadrant}
+        s = _remember(key, encoders[protocol_name](data_bytes, max_columns, max_lines))
+        try:
+                CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                cache_file.write_text(s, encoding='utf-8')
+                prune_cache()
+        except OSError:
+                pass  # the cache is only an optimization
+        return s
+
+
+def _remember(key, s):
+        _cache[key] = s
+        if len(_cache) > MEMORY_RENDERS:
+                _cache.popitem(last=False)
+        return s
+
+
+def prune_cache(max_bytes=CACHE_BYTES):
+        """ delete the least recently used renders until the disk cache fits in max_bytes """
+        files = []
+        for path in CACHE_DIR.iterdir():
+                try:
+                        stat = path.stat()
+                except OSError:
+                        continue  # removed by another vinca meanwhile
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for mtime, size, path in files)
+        for mtime, size, path in sorted(files):
+                if total <= max_bytes:
+                        break
+                path.unlink(missing_ok=True)
+                total -= size
+
+
+def _open(data_bytes):
+        """ decode an image as RGB, flattened onto the terminal background """
+        image = Image.open(BytesIO(data_bytes))
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, TERMINAL_BACKGROUND + (255,))
+        return Image.alpha_composite(background, image).convert('RGB')
+
+
+def _indent(rows):
+        return '\n'.join(' ' * MARGIN + row for row in rows)
+
+
+def _kitty(data_bytes, max_columns, max_lines):
+        # kitty decodes PNG itself, so we only need to tell it how many cells to fill
+        if (size := png_size(data_bytes)) is None:
+                if Image is None:
+                        return ''
+                buffer = BytesIO()
+                _open(data_bytes).save(buffer, format='PNG')
+                data_bytes = buffer.getvalue()
+                size = png_size(data_bytes)
+        cell_width, cell_height = cell_pixels()
+        width, height = fit(*size, max_columns * cell_width, max_lines * cell_height)
+        columns, lines = -(-width // cell_width), -(-height // cell_height)
+        payload = base64.standard_b64encode(data_bytes).decode()
+        # the payload must be sent in chunks of at most 4096 bytes
+        chunks = [payload[i:i + 4096] for i in range(0, len(payload), 4096)]
+        s = ' ' * MARGIN
+        for i, chunk in enumerate(chunks):
+                more = int(i < len(chunks) - 1)
+                control = f'a=T,f=100,c={columns},r={lines},C=1,q=2,m={more}' if i == 0 else f'm={more}'
+                s += f'{ESC}_G{control};{chunk}{ST}'
+        # kitty does not move the cursor (C=1), so we step over the image ourselves
+        return s + '\n' * lines
+
+
+def _sixel(data_bytes, max_columns, max_lines):
+        image = _open(data_bytes)
+        cell_width, cell_height = cell_pixels()
+        image = image.resize(fit(*image.size, max_columns * cell_width, max_lines * cell_height))
+        image = image.quantize(colors=128)
+        width, height = image.size
+        palette = image.getpalette()
+        pixels = image.tobytes()
+        s = f'{ESC}Pq"1;1;{width};{height}'
+        for i in range(len(palette) // 3):
+                r, g, b = (c * 100 // 255 for c in palette[3 * i: 3 * i + 3])
+                s += f'#{i};2;{r};{g};{b}'
+        # a sixel is a column of six pixels; the image is drawn in bands of six rows
+        for top in range(0, height, 6):
+                band = {}
+                for bit, y in enumerate(range(top, min(top + 6, height))):
+                        row = pixels[y * width:(y + 1) * width]
+                        for x, color in enumerate(row):
+                                sixels = band.setdefault(color, [0] * width)
+                                sixels[x] |= 1 << bit
+                layers = []
+                for color, sixels in band.items():
+                        line = bytes(63 + v for v in sixels).decode()
+                        # run length encode repeated characters: !<count><char>
+                        line = re.sub(r'(.)\1{3,}', lambda m: f'!{len(m.group())}{m.group(1)}', line)
+                        layers.append(f'#{color}{line}')
+                s += '$'.join(layers) + '-'
+        return ' ' * MARGIN + s + ST + '\n'
+
+
+def _halfblock(data_bytes, max_columns, max_lines):
+        # each cell shows two pixels: the upper half (▀) in the foreground color
+        # and the lower half in the background color
+        image = _open(data_bytes)
+        width, height = fit(*image.size, max_columns, max_lines * 2)
+        height += height % 2
+        image = image.resize((width, height))
+        pixels = image.load()
+        rows = []
+        for y in range(0, height, 2):
+                row = ''
+                for x in range(width):
+                        upper, lower = pixels[x, y], pixels[x, y + 1]
+                        row += '{e}[38;2;{};{};{}m{e}[48;2;{};{};{}m▀'.format(*upper, *lower, e=ESC)
+                rows.append(row + ESC + '[0m')
+        return _indent(rows) + '\n'
+
+
+def _quadrant(data_bytes, max_columns, max_lines):
+        # a dithered black and white image drawn with quadrant glyphs (▚▞▟...)
+        image = _open(data_bytes)
+        # each cell holds 2x2 pixels, but cells are twice as tall as they are wide
+        width, height = fit(image.width, max(1, image.height // 2), max_columns * 2, max_lines * 2)
+        pixels = image.resize((width, height)).convert('1').convert('L').tobytes()
+        bitmap = Bitmap([[int(bool(p)) for p in pixels[y * width:(y + 1) * width]] for y in range(height)])
+        return _indent(bitmap.to_unicode().splitlines()) + '\n'
+
+
+class TerminalImage:
+        """Draw an image inline in the terminal.
+        It has the same interface as video.DisplayImage
+        and can be used in its place when there is no X server."""
+
+        def __init__(self, *, image_path=None, data_bytes=None):
+                self.image_path = image_path
+                self.data_bytes = data_bytes
+                self.protocol = protocol()
+
+        def show(self):
+                data_bytes = self.data_bytes or Path(self.image_path).read_bytes()
+                sys.stdout.write(render(data_bytes, protocol_name=self.protocol))
+                sys.stdout.flush()
+
+        def close(self):
+                if self.protocol == 'kitty':
+                        # delete all visible placements
+                        sys.stdout.write(f'{ESC}_Ga=d,q=2{ST}')
+                        sys.stdout.flush()
+
+        def __enter__(self):
+                if self.data_bytes or (self.image_path and Path(self.image_path).exists()):
+                        self.show()
+
+        def __exit__(self, *exception_args):
+                if self.data_bytes or (self.image_path and Path(self.image_path).exists()):
+                        self.close()
@@ -0,0 +1,105 @@
+""" vinca media module: images are normalized before they are stored """
+
+import hashlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from vinca_CLI._config import max_image_size, originals_path
+
+from vinca_core.card import Card
+
+try:
+        from PIL import Image, ImageOps
+except ImportError:  # pillow is optional; without it images are stored as they are
+        Image = None
+
+BATCH_SIZE = 32  # number of images held in memory at once while optimizing
+
+
+def normalize_image(content, max_size=max_image_size):
+        """ convert an image to an optimized PNG no larger than max_size on either side.
+        Returns the original bytes if they are already a smaller PNG. """
+        if Image is None:
+                return content
+        try:
+                image = Image.open(BytesIO(content))
+                image = ImageOps.exif_transpose(image)  # phone photos are often stored sideways
+        except Exception:
+                return content  # not an image we can read
+        small_png = image.format == 'PNG' and max(image.size) <= max_size
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, format='PNG', optimize=True)
+        png = buffer.getvalue()
+        return content if small_png and len(content) <= len(png) else png
+
+
+def ingest_image(path):
+        """ read an image file for storage in the collection
+        and keep a copy of the original if the config asks for it """
+        path = Path(path)
+        content = path.read_bytes()
+        if originals_path:
+                originals = Path(originals_path).expanduser()
+                originals.mkdir(parents=True, exist_ok=True)
+                digest = hashlib.sha1(content).hexdigest()
+                shutil.copyfile(path, originals / (digest + path.suffix.lower()))
+        return normalize_image(content)
+
+
+class Media:
+        """ manage the images stored in the collection """
+
+        def __init__(self, cursor):
+                self.cursor = cursor
+
+        def _image_ids(self):
+                self.cursor.execute('SELECT front_image_id FROM cards WHERE front_image_id IS NOT NULL UNION '
+                                    'SELECT back_image_id FROM cards WHERE back_image_id IS NOT NULL')
+                return [row[0] for row in self.cursor.fetchall()]
+
+        def optimize(self, workers=None, dry_run=False):
+                """ convert every front and back image to a downsized PNG (uses all cores) """
+                if Image is None:
+                        return 'pillow is needed to optimize images: pip install pillow'
+                ids = self._image_ids()
+                before = after = replaced = 0
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                        # images are processed in batches so that a large
+                        # collection never has to be held in memory at once
+                        for start in range(0, len(ids), BATCH_SIZE):
+                                batch = ids[start:start + BATCH_SIZE]
+                                question_marks = ','.join('?' * len(batch))
+                                self.cursor.execute(f'SELECT id, content FROM media WHERE id IN ({question_marks})', batch)
+                                rows = self.cursor.fetchall()
+                                results = pool.map(normalize_image, [content for id, content in rows])
+                                for (old_id, old), new in zip(rows, results):
+                                        before += len(old)
+                                        if len(new) >= len(old):
+                                                after += len(old)
+                                                continue
+                                        after += len(new)
+                                        replaced += 1
+                                        if not dry_run:
+                                                self._replace(old_id, new)
+                                if not dry_run:
+                                        self.cursor.connection.commit()
+                saved = before - after
+                verb = 'would save' if dry_run else 'saved'
+                return (f'{replaced} of {len(ids)} images optimized; '
+                        f'{verb} {saved / 2**20:.1f} MB ({before / 2**20:.1f} MB -> {after / 2**20:.1f} MB)')
+
+        def _replace(self, old_id, content):
+                # the new image gets a new id (or that of an identical one) and the cards are
+                # pointed at it with an edit, so that the change reaches other devices through sync
+                new_id = Card._upload_media(self.cursor, content)
+                for field in ('front_image_id', 'back_image_id'):
+                        self.cursor.execute(f'INSERT INTO edits (card_id, {field}) '
+                                            f'SELECT id, ? FROM cards WHERE {field} = ?', (new_id, old_id))
+                # the old blob is no longer shown by any card here; one the server has stays until
+                # the other devices have the edits, and sync verification finds it on both sides
+                self.cursor.execute('DELETE FROM media WHERE id = ? AND server_timestamp IS NULL', (old_id,))
@@ -0,0 +1,111 @@
+""" vinca merge: copy another collection file into this one
+
+A collection is nothing but its edit, review and media logs; the cards are
+the result of replaying them. Merging two collections is therefore the union
+of their logs: every record of the other file whose id we do not have yet
+is inserted with one INSERT ... SELECT per table. An edit wins over an
+older edit of the same field on either side, exactly as after a sync, so
+there is nothing to resolve by hand. The other file is only read.
+
+Inserting hundreds of thousands of rows through the card_state and
+card_stats triggers would cost a trigger run per row, so these TRIGGERS are
+dropped for the duration of the merge and the rows of the affected cards
+are recomputed in bulk afterwards. Any other trigger on the logs (e.g. one
+keeping the tags table) is left in place and runs for every merged row.
+Cards that were already here and got reviews from the other file are then
+rescheduled from their combined history. Everything happens in one
+transaction: a failed merge leaves the collection untouched.
+
+The other file's review archive (other.archive.sqlite) is merged as well.
+Records keep their server timestamps, so records the server has never seen
+are uploaded by the next sync. """
+
+from pathlib import Path
+
+from vinca_CLI import _card_state
+from vinca_CLI import _card_stats
+from vinca_CLI._archive import reviews_source
+from vinca_CLI._scheduling import reschedule
+
+LOGS = ('edits', 'reviews', 'media')
+TRIGGERS = ('card_state_edit', 'card_state_review', 'card_stats_review')  # replaced by refreshes afterwards
+CACHE_KIB = 256 * 1024  # page cache during the merge; the id indexes are written in random order
+
+
+def _columns(cursor, schema, table):
+        return [row[1] for row in cursor.execute(f'PRAGMA {schema}.table_info({table})')]
+
+
+def merge(cursor, other):
+        """ merge the collection file OTHER into the collection of cursor; returns counts """
+        other = Path(other).expanduser()
+        if not other.exists():
+                raise FileNotFoundError(other)
+        connection = cursor.connection
+        connection.commit()
+        ours = reviews_source(cursor)  # attaches our archive, if there is one
+        cursor.execute('ATTACH DATABASE ? AS other', (str(other),))
+        other_archive = other.with_suffix('.archive.sqlite')
+        if other_archive.exists():
+                cursor.execute('ATTACH DATABASE ? AS other_archive', (str(other_archive),))
+        cache_size = cursor.execute('PRAGMA cache_size').fetchone()[0]
+        try:
+                if not (_columns(cursor, 'other', 'edits') and _columns(cursor, 'other', 'reviews')):
+                        raise ValueError(f'{other} is not a vinca collection')
+                cursor.execute(f'PRAGMA cache_size = -{CACHE_KIB}')
+                cursor.execute('BEGIN')  # DROP TRIGGER would otherwise be committed on its own
+                counts = _merge(cursor, ours, other_archive.exists())
+                connection.commit()
+        except BaseException:
+                connection.rollback()
+                raise
+        finally:
+                cursor.execute(f'PRAGMA cache_size = {cache_size}')
+                cursor.execute('DETACH DATABASE other')
+                if other_archive.exists():
+                        cursor.execute('DETACH DATABASE other_archive')
+        return counts
+
+
+def _merge(cursor, ours, other_archive):
+        # the records of the other file which are new to us
+        theirs = {'edits': 'other.edits', 'reviews': 'other.reviews', 'media': 'other.media'}
+        if other_archive:
+                theirs['reviews'] = '(SELECT * FROM other.reviews UNION ALL SELECT * FROM other_archive.reviews)'
+        new = {table: f'{theirs[table]} AS t WHERE t.id NOT IN (SELECT id FROM {ours if table == "reviews" else "main." + table})'
+               for table in LOGS}
+
+        # the cards these records touch, and whether each card was here before
+        cursor.execute('CREATE TEMP TABLE merged_cards (card_id INTEGER PRIMARY KEY, here, reviewed)')
+        cursor.execute(f'INSERT INTO temp.merged_cards SELECT card_id, 0, max(reviewed) FROM '
+                       f'(SELECT card_id, 0 AS reviewed FROM {new["edits"]} UNION ALL '
+                       f'SELECT card_id, 1 FROM {new["reviews"]}) GROUP BY card_id')
+        cursor.execute('UPDATE temp.merged_cards SET here = 1 WHERE card_id IN (SELECT card_id FROM main.edits)')
+
+        triggers = cursor.execute(f"SELECT name, sql FROM main.sqlite_master WHERE type = 'trigger' "
+                                  f"AND name IN {TRIGGERS}").fetchall()
+        for name, sql in triggers:
+                cursor.execute(f'DROP TRIGGER main.{name}')
+        counts = {}
+        for table in LOGS:
+                # columns both files have, so an older schema on either side still merges
+                other_columns = _columns(cursor, 'other', table)
+                if not other_columns:  # e.g. a file without images has no media table
+                        counts[table] = 0
+                        continue
+                shared = ', '.join(c for c in _columns(cursor, 'main', table) if c in other_columns)
+                cursor.execute(f'INSERT INTO main.{table} ({shared}) SELECT {shared} FROM {new[table]} ORDER BY t.id')
+                counts[table] = cursor.rowcount
+        for name, sql in triggers:
+                cursor.execute(sql)
+
+        affected = 'SELECT card_id FROM temp.merged_cards'
+        _card_state.refresh(cursor, affected)
+        _card_stats.refresh(cursor, affected + ' WHERE reviewed')
+        counts['new cards'], counts['cards changed'] = cursor.execute(
+                'SELECT total(NOT here), total(here) FROM temp.merged_cards').fetchone()
+        # the new due dates are written inside our transaction, which merge() commits
+        moved = reschedule(cursor, 'SELECT card_id FROM temp.merged_cards WHERE here AND reviewed', commit=False)
+        counts['rescheduled'] = len(moved)
+        cursor.execute('DROP TABLE temp.merged_cards')
+        return {key: int(value) for key, value in counts.items()}
@@ -0,0 +1,200 @@
+""" vinca sync verification with hash trees
+
+To find out whether two copies of a collection hold the same synced records
+we compare digests of id ranges, starting with the whole id space.
+Only ranges whose digests differ are split (into FANOUT parts) and compared
+again, so k differences among n records take O(log n) round trips and
+only the differing records are transferred.
+
+A range's digest is the sum of the hashes of its records (mod 2**64),
+so a peer can answer any range from sorted ids and prefix sums.
+
+Only records that decide what a card looks like are compared:
+✠ edits which the server has timestamped and no later synced edit supersedes
+  (compaction may already have removed the superseded ones), without their
+  seconds, which compaction moves onto the kept edits
+✠ timestamped reviews, including archived ones
+✠ timestamped media which the newest synced edit of some card shows
+Digests are built from the edits, reviews and media logs alone, which a
+copy of the server's database has as well. """
+
+import hashlib
+import sqlite3
+from bisect import bisect_left
+
+from vinca_CLI._archive import reviews_source
+from vinca_CLI._compaction import superseded_sql, BOOKKEEPING, SYNCED
+from vinca_CLI import _card_state
+from vinca_CLI import _card_stats
+
+TABLES = ('edits', 'reviews', 'media')
+FANOUT = 16
+LEAF_SIZE = 32  # ranges holding fewer records than this are compared record by record
+MIN_ID, MAX_ID = -2**63, 2**63  # ids are random 64 bit integers
+MASK = 2**64 - 1
+# the columns records are synced with, as in messenger_template.sqlite
+COLUMNS = {'edits': ('id', 'card_id', 'date', 'seconds', 'front_text', 'back_text', 'due_date', 'card_type',
+                     'scheduler', 'visibility', 'front_image_id', 'back_image_id', 'front_audio_id',
+                     'back_audio_id', 'server_timestamp', 'tags', 'merit'),
+           'reviews': ('id', 'card_id', 'date', 'seconds', 'grade', 'server_timestamp'),
+           'media': ('id', 'content', 'server_timestamp')}
+EDIT_FIELDS = tuple(c for c in COLUMNS['edits'] if c not in BOOKKEEPING)
+MEDIA_FIELDS = ('front_image_id', 'back_image_id', 'front_audio_id', 'back_audio_id')
+# the columns compared by the digests
+HASHED = dict(COLUMNS, edits=tuple(c for c in COLUMNS['edits'] if c != 'seconds'))
+
+
+def split(lo, hi):
+        step = -(-(hi - lo) // FANOUT)
+        return [(a, min(a + step, hi)) for a in range(lo, hi, step)]
+
+
+def record_hash(row):
+        return int.from_bytes(hashlib.blake2b(repr(row).encode(), digest_size=8).digest(), 'big')
+
+
+class Peer:
+        """ answers digest queries about the synced records of one collection """
+
+        def __init__(self, cursor):
+                self.cursor = cursor
+                self._index = {}
+
+        def _records_sql(self, table):
+                columns = ', '.join(HASHED[table])
+                if table == 'edits':
+                        superseded = superseded_sql(EDIT_FIELDS, SYNCED, SYNCED)
+                        return f'SELECT {columns} FROM edits WHERE {SYNCED} AND rowid NOT IN (SELECT rid FROM ({superseded}))'
+                if table == 'reviews':
+                        return f'SELECT {columns} FROM {reviews_source(self.cursor)} WHERE {SYNCED}'
+                # for each card and media field, the value of its newest synced edit setting that field
+                shown = ' UNION '.join(
+                        f'SELECT {field} FROM (SELECT {field}, row_number() OVER (PARTITION BY card_id '
+                        f'ORDER BY date DESC, rowid DESC) AS n FROM edits WHERE {SYNCED} AND {field} IS NOT NULL) '
+                        f'WHERE n = 1' for field in MEDIA_FIELDS)
+                return f'SELECT {columns} FROM media WHERE {SYNCED} AND id IN ({shown})'
+
+        def index(self, table):
+                """ sorted ids, record hashes, and prefix sums of the hashes """
+                if table not in self._index:
+                        records = sorted((row[0], record_hash(row)) for row in self.cursor.execute(self._records_sql(table)))
+                        ids = [id for id, h in records]
+                        prefix = [0]
+                        for id, h in records:
+                                prefix.append((prefix[-1] + h) & MASK)
+                        self._index[table] = (ids, dict(records), prefix)
+                return self._index[table]
+
+        def digests(self, table, ranges):
+                """ (record count, digest) for each [lo, hi) range """
+                ids, hashes, prefix = self.index(table)
+                answers = []
+                for lo, hi in ranges:
+                        i, j = bisect_left(ids, lo), bisect_left(ids, hi)
+                        answers.append((j - i, (prefix[j] - prefix[i]) & MASK))
+                return answers
+
+        def hashes(self, table, ranges):
+                """ {id: record hash} for the records in the ranges """
+                ids, hashes, prefix = self.index(table)
+                return {id: hashes[id] for lo, hi in ranges for id in ids[bisect_left(ids, lo):bisect_left(ids, hi)]}
+
+        def records(self, table, ids):
+                """ the complete rows with these ids """
+                source = reviews_source(self.cursor) if table == 'reviews' else table
+                rows = []
+                ids = list(ids)
+                for start in range(0, len(ids), 500):
+                        batch = ids[start:start + 500]
+                        question_marks = ','.join('?' * len(batch))
+                        rows += self.cursor.execute(f'SELECT {", ".join(COLUMNS[table])} FROM {source} '
+                                                    f'WHERE id IN ({question_marks})', batch).fetchall()
+                return rows
+
+
+class LocalPeer(Peer):
+        """ a copy of the server's database on disk, standing in for the server """
+
+        def __init__(self, path):
+                super().__init__(sqlite3.connect(f'file:{path}?mode=ro', uri=True).cursor())
+
+
+class Verification:
+
+        def __init__(self, local, remote):
+                self.local = local
+                self.remote = remote
+                self.round_trips = 0
+
+        def differing_ranges(self, table):
+                """ walk down the tree, one level per round trip, to the smallest differing ranges """
+                level, leaves = [(MIN_ID, MAX_ID)], []
+                while level:
+                        self.round_trips += 1
+                        ours, theirs = self.local.digests(table, level), self.remote.digests(table, level)
+                        next_level = []
+                        for (lo, hi), a, b in zip(level, ours, theirs):
+                                if a == b:
+                                        continue
+                                if max(a[0], b[0]) <= LEAF_SIZE or hi - lo <= FANOUT:
+                                        leaves.append((lo, hi))
+                                else:
+                                        next_level += split(lo, hi)
+                        level = next_level
+                return leaves
+
+        def diff(self, table):
+                """ ids (missing here, missing there, different) """
+                ranges = self.differing_ranges(table)
+                if not ranges:
+                        return set(), set(), set()
+                self.round_trips += 1
+                ours, theirs = self.local.hashes(table, ranges), self.remote.hashes(table, ranges)
+                missing_here = theirs.keys() - ours.keys()
+                missing_there = ours.keys() - theirs.keys()
+                different = {id for id in ours.keys() & theirs.keys() if ours[id] != theirs[id]}
+                return missing_here, missing_there, different
+
+        def repair(self, table, missing_here, missing_there, different):
+                """ copy the differing records from the remote; mark ours for upload """
+                cursor = self.local.cursor
+                fetch = missing_here | different
+                if fetch:
+                        self.round_trips += 1
+                rows = self.remote.records(table, fetch)
+                target = 'main.reviews' if table == 'reviews' else table
+                archived = table == 'reviews' and reviews_source(cursor) == 'all_reviews'
+                columns = ', '.join(COLUMNS[table])
+                with cursor.connection:
+                        for id in different:
+                                cursor.execute(f'DELETE FROM {target} WHERE id = ?', (id,))
+                                if archived:
+                                        cursor.execute('DELETE FROM archive.reviews WHERE id = ?', (id,))
+                        if rows:
+                                question_marks = ','.join('?' * len(rows[0]))
+                                cursor.executemany(f'INSERT INTO {target} ({columns}) VALUES ({question_marks})', rows)
+                        if archived and missing_there:
+                                self._unarchive(missing_there)
+                        # records the server lost will be pushed again by the next sync
+                        cursor.executemany(f'UPDATE {target} SET server_timestamp = NULL WHERE id = ?',
+                                           [(id,) for id in missing_there])
+                        if table != 'media' and different:
+                                ids = ','.join(str(int(row[1])) for row in rows)
+                                _card_state.refresh(cursor, ids)
+                                if table == 'reviews':
+                                        # the trigger counted the replacements on top of the deleted rows
+                                        _card_stats.refresh(cursor, ids)
+
+        def _unarchive(self, ids):
+                # only live reviews are uploaded, so archived ones the server lost go back into the collection
+                cursor = self.local.cursor
+                cursor.execute('CREATE TEMP TABLE unarchived (id PRIMARY KEY)')
+                cursor.executemany('INSERT INTO temp.unarchived VALUES (?)', [(id,) for id in ids])
+                cursor.execute('INSERT INTO main.reviews SELECT * FROM archive.reviews '
+                               'WHERE id IN (SELECT id FROM temp.unarchived)')
+                cursor.execute('DELETE FROM archive.reviews WHERE id IN (SELECT id FROM temp.unarchived)')
+                # the state and statistics already counted these reviews in the archive
+                cards = 'SELECT card_id FROM main.reviews WHERE id IN (SELECT id FROM temp.unarchived)'
+                _card_state.refresh(cursor, cards)
+                _card_stats.refresh(cursor, cards)
+                cursor.execute('DROP TABLE temp.unarchived')
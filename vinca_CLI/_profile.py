@@ -0,0 +1,248 @@
+""" vinca profiler: `vinca --profile COMMAND` or `VINCA_PROFILE=1 vinca COMMAND`
+
+Every connection opened after `enable` counts and times its statements:
+✠ each statement's executions, total and slowest time (fetching included)
+✠ the statements SQLite runs for us, such as trigger bodies
+✠ virtual machine steps, a measure of work that does not depend on the disk cache
+✠ repeated statements: the same SQL and parameters run again (a missing cache),
+  or the same SQL with different parameters many times (one query per card, N+1)
+Hot paths of the interface are timed with `start`/`stop` or `timer`
+(these also feed the latency telemetry, see _telemetry).
+When the command ends the report is printed to stderr, or written as JSON
+with `--profile=PATH` / `VINCA_PROFILE=PATH`. """
+
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+PROGRESS_STEPS = 1000  # the progress handler is called every PROGRESS_STEPS vm instructions
+N_PLUS_ONE = 10  # a statement run this often with different parameters is reported
+TOP = 10  # statements shown in each section of the report
+
+enabled = False
+_dump_path = None
+_command = ''
+_connect = sqlite3.connect
+
+statements = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'slowest': 0.0, 'vm_steps': 0})
+calls = defaultdict(int)  # (sql, parameters) -> executions
+traced = defaultdict(int)  # everything SQLite ran, as reported by the trace callback
+timers = defaultdict(list)  # hot path -> durations in seconds
+_started = {}
+_current = None  # the statement being stepped
+listeners = []  # called with (timer name, seconds) whenever a timer stops
+
+
+def _record(sql, parameters, seconds):
+        stats = statements[sql]
+        stats['count'] += 1
+        stats['seconds'] += seconds
+        stats['slowest'] = max(stats['slowest'], seconds)
+        calls[sql, repr(parameters)] += 1
+
+
+class ProfiledCursor(sqlite3.Cursor):
+
+        def execute(self, sql, parameters=()):
+                global _current
+                self._sql, _current = sql, sql
+                begin = time.perf_counter()
+                try:
+                        return super().execute(sql, parameters)
+                finally:
+                        _record(sql, parameters, time.perf_counter() - begin)
+
+        def executemany(self, sql, seq_of_parameters):
+                global _current
+                self._sql, _current = sql, sql
+                begin = time.perf_counter()
+                try:
+                        return super().executemany(sql, seq_of_parameters)
+                finally:
+                        _record(sql, 'many', time.perf_counter() - begin)
+
+        def executescript(self, sql_script):
+                global _current
+                self._sql, _current = sql_script, sql_script
+                begin = time.perf_counter()
+                try:
+                        return super().executescript(sql_script)
+                finally:
+                        _record(sql_script, (), time.perf_counter() - begin)
+
+        def _fetch(self, method, *args):
+                # rows are computed lazily, so fetching is part of a statement's cost
+                global _current
+                _current = getattr(self, '_sql', None)
+                begin = time.perf_counter()
+                try:
+                        return method(*args)
+                finally:
+                        if _current is not None:
+                                statements[_current]['seconds'] += time.perf_counter() - begin
+
+        def fetchone(self):
+                return self._fetch(super().fetchone)
+
+        def fetchmany(self, *args):
+                return self._fetch(super().fetchmany, *args)
+
+        def fetchall(self):
+                return self._fetch(super().fetchall)
+
+
+class ProfiledConnection(sqlite3.Connection):
+
+        def cursor(self, factory=ProfiledCursor):
+                return super().cursor(factory)
+
+
+def _trace(sql):
+        traced[sql] += 1
+
+
+def _progress():
+        if _current is not None:
+                statements[_current]['vm_steps'] += PROGRESS_STEPS
+        return 0  # carry on
+
+
+def connect(*args, **kwargs):
+        kwargs.setdefault('factory', ProfiledConnection)
+        connection = _connect(*args, **kwargs)
+        connection.set_trace_callback(_trace)
+        connection.set_progress_handler(_progress, PROGRESS_STEPS)
+        return connection
+
+
+def enable(dump_path=None, command=''):
+        """ profile every connection opened from now on """
+        global enabled, _dump_path, _command
+        if enabled:
+                return
+        enabled, _dump_path, _command = True, dump_path, command
+        sqlite3.connect = connect
+        atexit.register(_at_exit)
+
+
+def from_command_line(argv):
+        """ enable profiling for --profile[=PATH] (removed from argv) or VINCA_PROFILE """
+        setting = os.environ.get('VINCA_PROFILE')
+        for arg in argv[1:]:
+                if arg == '--profile' or arg.startswith('--profile='):
+                        argv.remove(arg)
+                        setting = arg.partition('=')[2] or '1'
+                        break
+        if setting and setting != '0':
+                enable(dump_path=None if setting == '1' else setting, command=' '.join(argv[1:]))
+
+
+def listen(callback):
+        """ time the hot paths even without --profile, and pass each measurement to callback """
+        listeners.append(callback)
+
+
+def start(name):
+        if enabled or listeners:
+                _started[name] = time.perf_counter()
+
+
+def stop(*names):
+        """ stop the timers which are running among names """
+        if not (enabled or listeners):
+                return
+        now = time.perf_counter()
+        for name in names:
+                if (begin := _started.pop(name, None)) is not None:
+                        if enabled:
+                                timers[name].append(now - begin)
+                        for callback in listeners:
+                                callback(name, now - begin)
+
+
+@contextmanager
+def timer(name):
+        start(name)
+        try:
+                yield
+        finally:
+                stop(name)
+
+
+def _percentile(durations, p):
+        durations = sorted(durations)
+        return durations[min(len(durations) - 1, int(p * len(durations)))]
+
+
+def report():
+        """ the measurements so far as a dict """
+        by_time = sorted(statements.items(), key=lambda item: item[1]['seconds'], reverse=True)
+        repeated = [{'sql': sql, 'parameters': parameters, 'count': count}
+                    for (sql, parameters), count in calls.items() if count > 1 and parameters != 'many']
+        executions = defaultdict(int)
+        for (sql, parameters) in calls:
+                executions[sql] += 1
+        n_plus_one = [{'sql': sql, 'distinct parameters': count}
+                      for sql, count in executions.items() if count >= N_PLUS_ONE]
+        return {
+                'command': _command,
+                'statements': sum(s['count'] for s in statements.values()),
+                'distinct statements': len(statements),
+                'sql seconds': sum(s['seconds'] for s in statements.values()),
+                'vm steps': sum(s['vm_steps'] for s in statements.values()),
+                'traced statements': sum(traced.values()),
+                'slowest': [dict(sql=sql, **stats) for sql, stats in by_time[:TOP]],
+                'repeated': sorted(repeated, key=lambda r: r['count'], reverse=True)[:TOP],
+                'n+1': sorted(n_plus_one, key=lambda r: r['distinct parameters'], reverse=True)[:TOP],
+                'timers': {name: {'count': len(durations),
+                                  'mean': sum(durations) / len(durations),
+                                  'p95': _percentile(durations, 0.95),
+                                  'max': max(durations)}
+                           for name, durations in timers.items() if durations},
+        }
+
+
+def _short(sql, width=100):
+        sql = ' '.join(sql.split())
+        return sql if len(sql) <= width else sql[:width - 1] + '…'
+
+
+def print_report(data, file=sys.stderr):
+        from rich.console import Console
+        console = Console(file=file, soft_wrap=True)
+        console.print(f'\n[bold]profile of[/] vinca {data["command"]}')
+        console.print(f'{data["statements"]} statements ({data["distinct statements"]} distinct, '
+                      f'{data["traced statements"]} including triggers) '
+                      f'took {data["sql seconds"] * 1000:.1f} ms and ~{data["vm steps"]} vm steps')
+        if data['slowest']:
+                console.print('[bold]slowest statements[/]   total ms   max ms   count')
+                for s in data['slowest']:
+                        console.print(f'{s["seconds"] * 1000:10.2f} {s["slowest"] * 1000:8.2f} {s["count"]:7d}   '
+                                      f'{_short(s["sql"])}', markup=False, highlight=False)
+        if data['n+1']:
+                console.print('[bold]run once per row (N+1)[/]')
+                for r in data['n+1']:
+                        console.print(f'{r["distinct parameters"]:7d} x  {_short(r["sql"])}', markup=False, highlight=False)
+        if data['repeated']:
+                console.print('[bold]repeated with the same parameters[/]')
+                for r in data['repeated']:
+                        console.print(f'{r["count"]:7d} x  {_short(r["sql"])} {r["parameters"]}', markup=False, highlight=False)
+        if data['timers']:
+                console.print('[bold]hot paths[/]            count   mean ms    p95 ms    max ms')
+                for name, t in data['timers'].items():
+                        console.print(f'{name:20s} {t["count"]:6d} {t["mean"] * 1000:9.2f} '
+                                      f'{t["p95"] * 1000:9.2f} {t["max"] * 1000:9.2f}')
+
+
+def _at_exit():
+        data = report()
+        if _dump_path:
+                with open(_dump_path, 'w') as f:
+                        json.dump(data, f, indent=1)
+        else:
+                print_report(data)
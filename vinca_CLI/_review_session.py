@@ -0,0 +1,108 @@
+""" vinca review session: decides which card to show next """
+
+import heapq
+import itertools
+import time
+from collections import deque
+
+from vinca_CLI._CLI_card import CLI_Card, GRADE_DICT
+from vinca_CLI._config import new_card_interval, relearn_delay
+
+BATCH_SIZE = 100  # cards fetched from the database at a time
+
+
+class CardStream:
+        """ The cards of a cardlist in (key, id) order, fetched a batch at a time.
+        Each batch continues where the last one stopped (keyset pagination),
+        so we never hold more than one batch no matter how many cards there are. """
+
+        def __init__(self, cardlist, key):
+                self.cardlist = cardlist
+                self.key = key
+                self.last = None
+                self.buffer = deque()
+                self.exhausted = False
+
+        def _fetch(self):
+                sql = f'SELECT {self.key}, id' + self.cardlist._FROM + self.cardlist._WHERE
+                params = ()
+                if self.last:
+                        sql += f' AND ({self.key}, id) > (?, ?)'
+                        params = self.last
+                sql += f' ORDER BY {self.key}, id LIMIT {BATCH_SIZE}'
+                rows = self.cardlist._cursor.execute(sql, params).fetchall()
+                self.buffer.extend(rows)
+                if rows:
+                        self.last = rows[-1]
+                self.exhausted = len(rows) < BATCH_SIZE
+
+        def pop(self):
+                """ the id of the next card, or None """
+                if not self.buffer and not self.exhausted:
+                        self._fetch()
+                return self.buffer.popleft()[1] if self.buffer else None
+
+
+class ReviewSession:
+        """Serves the due cards of a cardlist one at a time:
+        ✠ review cards come straight from the database, most overdue first
+        ✠ a new card is shown after every `new_card_interval` reviews
+        ✠ a card graded 'again' comes back after `relearn_delay` seconds
+        Memory use does not depend on the number of due cards,
+        only on the number of cards waiting to be relearned."""
+
+        def __init__(self, cardlist, new_card_interval=new_card_interval, relearn_delay=relearn_delay):
+                self._cursor = cardlist._cursor
+                visible = cardlist.filter(deleted=False)
+                # lets SQLite use the partial index on the due dates of visible cards
+                visible._conditions.append("visibility = 'visible'")
+                self.reviews = CardStream(visible.filter(due=True, new=False), 'due_date')
+                self.new_cards = CardStream(visible.filter(new=True), 'create_date')
+                self.new_card_interval = new_card_interval
+                self.relearn_delay = relearn_delay
+                self.relearning = []  # heap of (time when due again, tiebreak, card id)
+                self.relearning_ids = set()  # the cards in that heap
+                self._tiebreak = itertools.count()
+                self.reviews_since_new = 0
+                self.reviewed = 0
+
+        def _from_streams(self):
+                # interleave new cards among the reviews
+                new_turn = self.new_card_interval and self.reviews_since_new >= self.new_card_interval
+                streams = (self.new_cards, self.reviews) if new_turn else (self.reviews, self.new_cards)
+                for stream in streams:
+                        while (id := stream.pop()) is not None:
+                                # the streams only move forward, so a card meets them again only if
+                                # its review left it due: graded 'again', it is served from the heap
+                                if id in self.relearning_ids:
+                                        continue
+                                self.reviews_since_new = 0 if stream is self.new_cards else self.reviews_since_new + 1
+                                return id
+                return None
+
+        def next_card(self):
+                """ the next card to review, or None when the session is over """
+                if self.relearning and self.relearning[0][0] <= time.time():
+                        id = self._relearn()
+                elif (id := self._from_streams()) is None and self.relearning:
+                        # nothing else is left, so don't make the user wait
+                        id = self._relearn()
+                return None if id is None else CLI_Card(id, self._cursor)
+
+        def _relearn(self):
+                id = heapq.heappop(self.relearning)[2]
+                self.relearning_ids.discard(id)
+                return id
+
+        def answer(self, card, grade_key):
+                """ record how the user graded a card """
+                if (grade := GRADE_DICT.get(grade_key)) is None:
+                        return
+                self.reviewed += 1
+                if grade == 'again':
+                        heapq.heappush(self.relearning, (time.time() + self.relearn_delay, next(self._tiebreak), card.id))
+                        self.relearning_ids.add(card.id)
+
+        def __iter__(self):
+                while (card := self.next_card()) is not None:
+                        yield card
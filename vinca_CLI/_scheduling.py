@@ -0,0 +1,87 @@
+""" vinca bulk scheduling module
+
+The rules of vinca_core.scheduling.History, applied to many cards at once.
+A card's due date only depends on four values: its create date,
+the date of its last 'again' (its reset date), the date of its last review
+and the grade of that review. We aggregate these for every card in one query
+over the reviews table instead of building a History for each card. """
+
+from vinca_core.scheduling import ease_dict
+
+from vinca_CLI._lib.julianday import today, JulianDate
+from vinca_CLI._archive import reviews_source
+from vinca_CLI._card_state import source
+
+GRADES = ('again', 'hard', 'good', 'easy')
+RELEARN_INTERVAL = 0.003  # an 'again' card is due four minutes later
+
+
+def due_date(create_date, last_reset_date, last_study_date, last_grade):
+        """ the due date that History.new_due_date would give """
+        if last_reset_date is None:
+                last_reset_date = create_date
+        if last_study_date is None:
+                last_study_date = create_date
+        if last_grade == 'again':
+                return last_reset_date + RELEARN_INTERVAL
+        study_maturity = int(last_study_date) - int(last_reset_date)
+        interval = max(1, int(ease_dict[last_grade] * study_maturity))
+        return int(last_study_date) + interval
+
+
+def hypothetical_due_dates(create_date, last_reset_date, last_study_date, last_grade, date=None):
+        """ days from today until the card is due for each grade we might give it now """
+        date = today() if date is None else date
+        projections = {}
+        for grade in GRADES:
+                reset = last_reset_date
+                if grade == 'again':
+                        reset = date if last_reset_date is None else max(date, last_reset_date)
+                # as in History, an earlier review on the same date stays the last study
+                if last_study_date is None or date > last_study_date:
+                        study, study_grade = date, grade
+                else:
+                        study, study_grade = last_study_date, last_grade
+                due = due_date(create_date, reset, study, study_grade)
+                projections[grade] = JulianDate(due).relative_date
+        return projections
+
+
+def card_states(cursor, card_ids_sql='SELECT id FROM cards'):
+        """ {card_id: (create_date, last_reset_date, last_study_date, last_grade)}
+        for the cards selected by card_ids_sql, aggregated by SQLite in one query """
+        reviews = reviews_source(cursor)
+        # the grade of the last review: on a tie, that of the review with the lowest id
+        rows = cursor.execute(f'''
+                SELECT c.id, c.create_date, r.reset, r.study,
+                       (SELECT grade FROM {reviews} g WHERE g.card_id = c.id AND g.date = r.study ORDER BY g.id LIMIT 1)
+                FROM {source(cursor)} c LEFT JOIN
+                        (SELECT card_id, max(CASE WHEN grade = 'again' THEN date END) AS reset, max(date) AS study
+                         FROM {reviews} WHERE card_id IN ({card_ids_sql}) GROUP BY card_id) r
+                ON r.card_id = c.id
+                WHERE c.id IN ({card_ids_sql})''')
+        return {id: tuple(state) for id, *state in rows}
+
+
+def reschedule(cursor, card_ids_sql='SELECT id FROM cards', dry_run=False, commit=True):
+        """ recompute the due dates of many reviewed cards and save them in one transaction.
+        With commit=False the edits are left in the caller's transaction.
+        Returns a list of (card_id, old_due_date, new_due_date) for the cards that move. """
+        states = card_states(cursor, card_ids_sql)
+        old_due_dates = dict(cursor.execute(f'SELECT id, due_date FROM {source(cursor)} WHERE id IN ({card_ids_sql})'))
+        changes = []
+        for id, state in states.items():
+                if state[2] is None:
+                        continue  # a card without reviews stays new: due on its create date
+                new = due_date(*state)
+                old = old_due_dates.get(id)
+                if old is None or abs(new - old) > 1e-6:
+                        changes.append((id, old, new))
+        if not dry_run and changes:
+                rows = [(id, new) for id, old, new in changes]
+                if not commit:
+                        cursor.executemany('INSERT INTO edits (card_id, due_date) VALUES (?, ?)', rows)
+                        return changes
+                with cursor.connection:  # a single transaction
+                        cursor.executemany('INSERT INTO edits (card_id, due_date) VALUES (?, ?)', rows)
+        return changes
@@ -0,0 +1,98 @@
+""" vinca free space management
+
+Deleting rows (purging cards, optimizing or archiving) leaves free pages
+inside the collection file; SQLite reuses them but never gives them back.
+VACUUM does, but it rewrites the whole file inside one long transaction.
+
+With auto_vacuum = INCREMENTAL, `PRAGMA incremental_vacuum(N)` instead
+moves N free pages to the end of the file and truncates it. `vinca reclaim`
+does this a few hundred pages at a time, committing after every step,
+so a review session running at the same time only ever waits for one step.
+If another connection keeps the collection locked, reclaiming backs off a
+few times and then stops, reporting what it has given back so far. """
+
+import sqlite3
+import time
+
+PAGES_PER_STEP = 256
+PAUSE = 0.01  # seconds between steps, to let other connections write
+RETRIES = 3  # steps attempted in a row while another connection writes, each waiting longer
+NONE, FULL, INCREMENTAL = 0, 1, 2
+
+
+def auto_vacuum(cursor):
+        return cursor.execute('PRAGMA auto_vacuum').fetchone()[0]
+
+
+def reclaimable(cursor):
+        """ bytes held by free pages """
+        free_pages = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+        return free_pages * cursor.execute('PRAGMA page_size').fetchone()[0]
+
+
+def human_size(size):
+        for unit in ('B', 'KB', 'MB', 'GB'):
+                if size < 1024 or unit == 'GB':
+                        return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+                size /= 1024
+
+
+def make_incremental(cursor):
+        """ switch a collection to incremental auto_vacuum; this rewrites the file once """
+        cursor.connection.commit()
+        cursor.execute(f'PRAGMA auto_vacuum = {INCREMENTAL}')
+        cursor.execute('VACUUM')  # the mode of an existing database only changes with a VACUUM
+
+
+class Space:
+        """ free space in the collection file: `vinca reclaim` """
+
+        def __init__(self, cursor):
+                self.cursor = cursor
+
+        def status(self):
+                """ how much space reclaiming would give back """
+                modes = {NONE: 'none', FULL: 'full', INCREMENTAL: 'incremental'}
+                pages, page_size = (self.cursor.execute(f'PRAGMA {p}').fetchone()[0] for p in ('page_count', 'page_size'))
+                return {'file size': human_size(pages * page_size),
+                        'reclaimable': human_size(reclaimable(self.cursor)),
+                        'auto vacuum': modes[auto_vacuum(self.cursor)]}
+
+        def enable(self):
+                """ switch the collection to incremental vacuum (rewrites it once) """
+                if auto_vacuum(self.cursor) == INCREMENTAL:
+                        return 'incremental vacuum is already enabled'
+                make_incremental(self.cursor)
+                return f'incremental vacuum enabled; {self.status()["file size"]}'
+
+        def reclaim(self, pages=PAGES_PER_STEP, max_seconds=None):
+                """ give free pages back to the file system, PAGES at a time """
+                if not reclaimable(self.cursor):
+                        return 'nothing to reclaim'
+                if auto_vacuum(self.cursor) != INCREMENTAL:
+                        return (f'{human_size(reclaimable(self.cursor))} reclaimable, but this collection does not '
+                                'use incremental vacuum; run `vinca space enable` once to switch it')
+                before = reclaimable(self.cursor)
+                start = time.time()
+                failures = 0
+                while reclaimable(self.cursor):
+                        try:
+                                # each step is a short transaction of its own; executescript steps the pragma
+                                # to completion, execute would free a single page
+                                self.cursor.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+                                failures = 0
+                        except sqlite3.OperationalError as error:
+                                if 'locked' not in str(error) and 'busy' not in str(error):
+                                        raise
+                                failures += 1  # another connection is writing
+                                if failures > RETRIES:
+                                        break
+                                time.sleep(PAUSE * 4 ** failures)
+                        if max_seconds is not None and time.time() - start > max_seconds:
+                                break
+                        time.sleep(PAUSE)
+                left = reclaimable(self.cursor)
+                report = f'{human_size(before - left)} reclaimed' + (f', {human_size(left)} left' if left else '')
+                if failures > RETRIES:
+                        report += ' (stopped: the collection is busy, try again later)'
+                return report
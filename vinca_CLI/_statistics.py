@@ -4,6 +4,15 @@ from vinca_CLI._lib.julianday import today
 from vinca_CLI._lib.terminal import COLUMNS
 from vinca_CLI._lib import unicode_bitmaps
 from vinca_CLI._lib import ansi
+from vinca_CLI._archive import reviews_source
+from vinca_CLI._card_state import source
+from vinca_CLI._scheduling import GRADES, card_states, due_date
+from vinca_CLI._space import reclaimable, human_size
+from vinca_CLI._telemetry import percentiles
+
+import bisect
+import itertools
+import random
 
 from rich import console
 from rich import align
@@ -11,10 +20,15 @@ print = console.Console().print
 
 class Statistics:
 
-    def __init__(self, cursor, interval=7):
+    def __init__(self, cursor, interval=7, forecast=26, simulate=False):
+            # cursor is None for statistics which only print a summary they are given
             self.cursor = cursor
+            self.reviews = reviews_source(cursor) if cursor else None  # includes archived reviews
+            self.cards = source(cursor) if cursor else None
             self.interval = interval
             self.bincount = 100
+            self.forecast = forecast  # intervals to look ahead
+            self.simulate = simulate
             self.height = 6
 
     @property
@@ -23,7 +37,7 @@ class Statistics:
 
     def review_counts(self):
             min_week = self.current_week - self.bincount + 1
-            self.cursor.execute('SELECT round(date / ?) as week, count(*) as count FROM reviews'
+            self.cursor.execute(f'SELECT round(date / ?) as week, count(*) as count FROM {self.reviews}'
              ' GROUP BY week HAVING week >= ?', (self.interval, min_week))
             rows = self.cursor.fetchall()
             d = {week: 0 for week in range(min_week, self.current_week)}
@@ -34,7 +48,7 @@ class Statistics:
 
     def create_counts(self):
             min_week = self.current_week - self.bincount + 1
-            self.cursor.execute('SELECT round(create_date / ?) as week, count(*) as count FROM cards'
+            self.cursor.execute(f'SELECT round(create_date / ?) as week, count(*) as count FROM {self.cards}'
              ' GROUP BY week HAVING week >= ?', (self.interval, min_week))
             rows = self.cursor.fetchall()
             d = {week: 0 for week in range(min_week, self.current_week)}
@@ -43,6 +57,55 @@ class Statistics:
                 d[week] = count
             return d.values()
 
+    def due_counts(self):
+            # cards due in each coming interval, counted from today; overdue cards are in the first
+            self.cursor.execute(f'SELECT max(CAST((due_date - ?) / ? AS INTEGER), 0) AS bin, count(*) FROM {self.cards}'
+             " WHERE visibility = 'visible' AND due_date < ? GROUP BY bin",
+             (today(), self.interval, today() + self.forecast * self.interval))
+            counts = [0] * self.forecast
+            for bin, count in self.cursor.fetchall():
+                counts[bin] = count
+            return counts
+
+    def grade_rates(self):
+            self.cursor.execute(f'SELECT grade, count(*) FROM {self.reviews} GROUP BY grade')
+            counts = dict(self.cursor.fetchall())
+            total = sum(counts.get(grade, 0) for grade in GRADES)
+            if not total:
+                return {'again': 0.1, 'hard': 0.1, 'good': 0.7, 'easy': 0.1}
+            return {grade: counts.get(grade, 0) / total for grade in GRADES}
+
+    def simulated_counts(self, seed=0):
+            # reviews in each coming interval if every card is studied on its due date
+            # and graded at random with the collection's historical grade rates
+            rng = random.Random(seed)
+            rates = self.grade_rates()
+            grades, cumulative = list(rates), list(itertools.accumulate(rates.values()))
+            start, horizon = today(), today() + self.forecast * self.interval
+            selection = f"SELECT id FROM {self.cards} WHERE visibility = 'visible' AND due_date < {horizon}"
+            due_dates = dict(self.cursor.execute(f'SELECT id, due_date FROM {self.cards} WHERE id IN ({selection})'))
+            counts = [0] * self.forecast
+            for id, (create, reset, study, grade) in card_states(self.cursor, selection).items():
+                due = max(due_dates[id], start)
+                while due < horizon:
+                    counts[int((due - start) // self.interval)] += 1
+                    grade = grades[min(bisect.bisect(cumulative, rng.random() * cumulative[-1]), 3)]
+                    reset = due if grade == 'again' else reset
+                    study = due
+                    # a failed card is relearned in the same session; its next review is a day or more away
+                    due = max(due_date(create, reset, study, grade), due + 1)
+            return counts
+
+    def forecast_stats(self, counts):
+            return (f'{counts[0]} due in the next {self.interval} days (overdue included)  '
+                    f'{sum(counts)} in the next {self.forecast * self.interval} days')
+
+    def latency_stats(self):
+            rows = [f'{"latency (ms)":16s}{"p50":>8s}{"p95":>8s}{"p99":>8s}{"samples":>9s}']
+            for name, (count, p50, p95, p99) in sorted(percentiles(self.cursor).items()):
+                rows.append(f'{name:16s}{p50:8.1f}{p95:8.1f}{p99:8.1f}{count:9d}')
+            return '\n'.join(rows) if len(rows) > 1 else ''
+
     def counts_to_scores(self, counts):
             score_unit = max(counts) // self.height
             score_unit = max(score_unit, 1)
@@ -59,25 +122,22 @@ class Statistics:
     def counts_to_unicode(self, counts):
             return self.scores_to_bitmap(self.counts_to_scores(counts)).to_unicode()
 
-    def review_stats(self):
-            self.cursor.execute('SELECT count(*) FROM reviews')
-            total_reviews = self.cursor.fetchone()[0]
-            if total_reviews is None: total_reviews = 0
-            self.cursor.execute('SELECT sum(seconds) FROM reviews')
-            total_time = self.cursor.fetchone()[0]
-            if total_time is None: total_time = 0
-            self.cursor.execute('SELECT min(date) FROM reviews')
-            first_date = self.cursor.fetchone()[0]
+    def review_totals(self):
+            # (reviews, seconds, first review date, reviews and seconds in the last interval)
+            total_reviews, total_time, first_date = self.cursor.execute(
+                f'SELECT count(*), coalesce(sum(seconds), 0), min(date) FROM {self.reviews}').fetchone()
+            recent_reviews, recent_time = self.cursor.execute(
+                f'SELECT count(*), coalesce(sum(seconds), 0) FROM {self.reviews} WHERE date > ?',
+                (today() - self.interval,)).fetchone()
+            return total_reviews, total_time, first_date, recent_reviews, recent_time
+
+    def review_stats(self, totals=None):
+            total_reviews, total_time, first_date, recent_reviews, recent_time = totals or self.review_totals()
             if first_date is None: first_date = today() - 1
             total_days = today() - first_date
             reviews_per_day = total_reviews / total_days
             time_per_review = total_time / total_reviews if total_reviews else 0
             time_per_day = total_time / total_days
-            self.cursor.execute('SELECT count(*) FROM reviews WHERE date > ?',(today() - self.interval,))
-            recent_reviews = self.cursor.fetchone()[0]
-            self.cursor.execute('SELECT sum(seconds) FROM reviews WHERE date > ?',(today() - self.interval,))
-            recent_time = self.cursor.fetchone()[0]
-            if recent_time is None: recent_time = 0
             return (f'{total_reviews} reviews '
                     f'{reviews_per_day:.1f} per day '
                     f'{recent_reviews} in the past {self.interval} days\n'
@@ -85,36 +145,62 @@ class Statistics:
                     f'{total_time // 3600} hours '
                     f'{recent_time // 60} minutes in the last {self.interval} days')
 
-    def create_stats(self):
-            self.cursor.execute('SELECT count(*) FROM cards')
-            total_cards = self.cursor.fetchone()[0]
-            if total_cards is None: total_cards = 0
-            self.cursor.execute('SELECT min(create_date) FROM cards')
-            first_date = self.cursor.fetchone()[0]
+    def create_totals(self):
+            # (cards, first create date, cards created in the last interval)
+            return self.cursor.execute(f'SELECT count(*), min(create_date), total(create_date > ?) FROM {self.cards}',
+                                       (today() - self.interval,)).fetchone()
+
+    def create_stats(self, totals=None):
+            total_cards, first_date, created_recent = totals or self.create_totals()
             if first_date is None: first_date = today() - 1
             total_days = today() - first_date
             cards_per_day = total_cards / total_days
-            self.cursor.execute('SELECT count(*) FROM cards WHERE create_date > ?',(today() - self.interval,))
-            created_recent = self.cursor.fetchone()[0]
-            if created_recent is None: created_recent = 0
             return (f'{total_cards} cards created '
                     f'{cards_per_day:.1f} per day '
-                    f'{created_recent} in the past {self.interval} days')
+                    f'{int(created_recent)} in the past {self.interval} days')
+
+    def summary(self):
+            """ the numbers behind the graphs and totals; summaries of several collections add up """
+            due_counts = []
+            if self.forecast:
+                due_counts = self.simulated_counts() if self.simulate else self.due_counts()
+            return {'reviews': list(self.review_counts()),
+                    'created': list(self.create_counts()),
+                    'due': due_counts,
+                    'review totals': self.review_totals(),
+                    'create totals': self.create_totals()}
+
+    def free_space(self):
+            return reclaimable(self.cursor)
 
     def print(self):
-            review_map = self.counts_to_unicode(self.review_counts())
-            create_map = self.counts_to_unicode(self.create_counts())
+            summary = self.summary()
+            review_map = self.counts_to_unicode(summary['reviews'])
+            create_map = self.counts_to_unicode(summary['created'])
             print(justify='center')
             print('[underline]STATISTICS',style='bold',end='',justify='center')
             print(f'graphs show {self.bincount} intervals of {self.interval} days',justify='center')
             print(justify='center')
             print(align.Align.center(review_map), style='green')
             print('▔'*(self.bincount//2), style='red',justify='center')
-            print(self.review_stats(), style='green',justify='center')
+            print(self.review_stats(summary['review totals']), style='green',justify='center')
             print(justify='center')
+            if self.forecast:
+                due_counts = summary['due']
+                print(justify='center')
+                print('simulated reviews' if self.simulate else 'cards coming due',
+                      f'in the next {self.forecast} intervals', style='yellow', justify='center')
+                print(align.Align.center(self.counts_to_unicode(due_counts)), style='yellow')
+                print('▔'*((self.forecast + 1)//2), style='red',justify='center')
+                print(self.forecast_stats(due_counts), style='yellow',justify='center')
+                print(justify='center')
             print(justify='center')
             print(align.Align.center(create_map), style='blue')
             print('▔'*(self.bincount//2), style='red',justify='center')
-            print(self.create_stats(), style='blue',justify='center')
+            print(self.create_stats(summary['create totals']), style='blue',justify='center')
             print(justify='center')
-
+            if latencies := self.latency_stats():
+                print(align.Align.center(latencies), style='dim')
+                print(justify='center')
+            if free := self.free_space():
+                print(f'{human_size(free)} of free space can be reclaimed with `vinca reclaim`', style='dim', justify='center')
@@ -5,6 +5,9 @@ from tempfile import NamedTemporaryFile
 import shutil
 import datetime
 
+from vinca_CLI._compaction import Compactor, checkpoint, set_checkpoint
+from vinca_CLI._merkle import TABLES, Peer, LocalPeer, Verification
+
 
 url = "http://127.0.0.1:8000/"
 client_changes_url = url + 'sync/client_changes'
@@ -39,6 +42,8 @@ class Sync:
         # 4 POST
         # 5 receive back a db containing the server timestamps
         # 6 update records with the timestamps received from the server
+        # edits which later edits overwrite need not be uploaded at all
+        Compactor(self.cursor).coalesce_unsynced()
         with NamedTemporaryFile() as messenger, NamedTemporaryFile() as server_reply:
             # 1 copy messenger_template to messenger.name
             shutil.copy(messenger_template, messenger.name)
@@ -65,6 +70,7 @@ class Sync:
                 return login()
             # 5 receive back the binary of a db with server timestamps
             server_reply.write(response.content) # copy bytes into a file
+            server_reply.flush()
             # 6 update records with the timestamps received from the server
             self.cursor.execute(f'ATTACH DATABASE "{server_reply.name}" AS reply')
             rowcount = 0
@@ -74,7 +80,7 @@ class Sync:
                         WHERE EXISTS (SELECT server_timestamp FROM reply.{table} AS r WHERE r.id = {table}.id)')
                 rowcount += self.cursor.rowcount
             self.cursor.connection.commit()
-            self.cursor.connection.close()
+            self.cursor.execute('DETACH DATABASE reply')
             print(f'{rowcount} records were time-stamped by the server')
 
     def server_changes(self):
@@ -83,7 +89,8 @@ class Sync:
         # 3 Copy these records into ourself
         #
         # 1 find the lastest_timestamp among our records
-        latest_timestamp = 0
+        # compacted records are no longer here, so we also remember our checkpoint
+        latest_timestamp = checkpoint(self.cursor)
         for table in ('edits','reviews','media'):
             ts = self.cursor.execute(f'SELECT max(server_timestamp) FROM {table}').fetchone()[0] or 0
             latest_timestamp = max(latest_timestamp, ts)
@@ -95,15 +102,43 @@ class Sync:
         # 3 Copy these records into ourself
         with NamedTemporaryFile() as server_reply:
             server_reply.write(response.content)
+            server_reply.flush()
             self.cursor.execute(f'ATTACH DATABASE "{server_reply.name}" AS reply')
             rowcount = 0
             for table in ('edits','reviews','media'):
                 self.cursor.execute(f'INSERT INTO {table} SELECT * FROM reply.{table}')
                 rowcount += self.cursor.rowcount
+            # we now hold every record up to the newest timestamp the server sent
+            newest = max([latest_timestamp] + [self.cursor.execute(f'SELECT max(server_timestamp) FROM reply.{table}').fetchone()[0] or 0
+                                              for table in ('edits','reviews','media')])
+            set_checkpoint(self.cursor, newest)
             self.cursor.connection.commit()
+            self.cursor.execute('DETACH DATABASE reply')
+            Compactor(self.cursor).compact()
             self.cursor.connection.close()
         print(f'{rowcount} records were received from the server')
 
+    def compact(self):
+        ''' remove edits which later edits have overwritten '''
+        count = Compactor(self.cursor).compact()
+        return f'{count} superseded edits removed'
+
+    def verify(self, other=None, repair=False):
+        ''' check that our synced records match the server's, and --repair the differences '''
+        if other is None:
+            return ('The sync server cannot answer digest queries yet. '
+                    'Compare with a copy of its database: verify --other PATH')
+        verification = Verification(Peer(self.cursor), LocalPeer(Path(other).expanduser()))
+        report = {}
+        for table in TABLES:
+            missing_here, missing_there, different = verification.diff(table)
+            report[table] = (f'{len(missing_here)} missing here, {len(missing_there)} missing there, '
+                             f'{len(different)} different')
+            if repair and (missing_here or missing_there or different):
+                verification.repair(table, missing_here, missing_there, different)
+        report['round trips'] = verification.round_trips
+        return report
+
     def sync(self):
         self.client_changes()  # push changes
         self.server_changes()  # pull changes
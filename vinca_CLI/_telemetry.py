@@ -0,0 +1,75 @@
+""" vinca latency telemetry
+
+The hot paths timed by _profile (drawing a card for review, the time from
+a grade key to the next card, image display, writing a review, browser
+redraws) are recorded on every run, not only with --profile. Measurements
+are kept in memory and written with one statement when the command ends,
+so recording adds no database work to the paths being measured.
+
+The latency table is a ring buffer: a trigger drops the oldest rows once
+it holds telemetry_size of them, so it stays a few hundred KB.
+`vinca stats` shows the percentiles of what it holds. """
+
+import atexit
+import sqlite3
+import time
+
+from vinca_CLI._config import telemetry_size
+from vinca_CLI import _profile
+
+
+def schema(size):
+        return f'''
+CREATE TABLE IF NOT EXISTS latency (
+        seq INTEGER PRIMARY KEY,
+        session REAL,
+        name TEXT,
+        milliseconds REAL);
+DROP TRIGGER IF EXISTS latency_ring;
+CREATE TRIGGER latency_ring AFTER INSERT ON latency
+BEGIN
+        DELETE FROM latency WHERE seq <= new.seq - {int(size)};
+END;
+'''
+
+
+def percentiles(cursor, points=(0.5, 0.95, 0.99)):
+        """ {name: (count, p50, p95, p99)} in milliseconds over the recorded latencies """
+        if not cursor.execute("SELECT count(*) FROM sqlite_master WHERE name = 'latency'").fetchone()[0]:
+                return {}
+        samples = {}
+        for name, milliseconds in cursor.execute('SELECT name, milliseconds FROM latency ORDER BY name, milliseconds'):
+                samples.setdefault(name, []).append(milliseconds)
+        return {name: (len(values), *(values[min(len(values) - 1, int(p * len(values)))] for p in points))
+                for name, values in samples.items()}
+
+
+class Telemetry:
+
+        def __init__(self, cursor, size=telemetry_size):
+                self.cursor = cursor
+                self.size = size
+                self.session = time.time()
+                self.measurements = []
+
+        def record(self, name, seconds):
+                self.measurements.append((self.session, name, seconds * 1000))
+
+        def install(self):
+                """ start recording the hot paths; they are saved when the program exits """
+                if not self.size:
+                        return
+                _profile.listen(self.record)
+                atexit.register(self.flush)
+
+        def flush(self):
+                if not self.measurements:
+                        return
+                try:
+                        with self.cursor.connection:
+                                self.cursor.executescript(schema(self.size))
+                                self.cursor.executemany('INSERT INTO latency (session, name, milliseconds) VALUES (?, ?, ?)',
+                                                        self.measurements)
+                except sqlite3.Error:
+                        return  # the connection is gone or the collection is locked; a lost sample is harmless
+                self.measurements.clear()